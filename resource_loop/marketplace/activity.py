@@ -0,0 +1,204 @@
+"""
+Buffered ActivityLog writes.
+
+log_activity() only appends an event to a buffer; rows reach the database in
+bulk_create batches. With REDIS_URL set the buffer is a Redis list shared by
+all processes and drained by `flush_activity_log_task` (Celery beat). Without
+Redis each process keeps an in-memory buffer flushed by a background thread
+every ACTIVITY_LOG_FLUSH_INTERVAL seconds and at exit.
+
+Old rows are rolled over into monthly gzipped JSON-lines archives in the
+`archives` storage and deleted by `prune_activity_log()` (see ACTIVITY_LOG_RETENTION_DAYS).
+"""
+import atexit
+import gzip
+import json
+import logging
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = 'activity-log:buffer'
+
+
+class MemoryBuffer:
+    """Per-process buffer with a daemon thread that flushes it periodically."""
+
+    def __init__(self, max_size, interval):
+        self._events = deque(maxlen=max_size)
+        self._interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def push(self, event):
+        if len(self._events) == self._events.maxlen:
+            logger.warning("Activity log buffer full, dropping oldest event")
+        self._events.append(event)
+        self._ensure_thread()
+        if len(self._events) >= settings.ACTIVITY_LOG_BATCH_SIZE:
+            self._wake.set()
+
+    def drain(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._events.popleft())
+            except IndexError:
+                break
+        return events
+
+    def requeue(self, events):
+        """Put drained events back at the front, in their original order."""
+        self._events.extendleft(reversed(events))
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='activity-log-flush', daemon=True)
+                self._thread.start()
+                atexit.register(flush_activity_log)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                flush_activity_log()
+            except Exception:
+                logger.exception("Activity log flush failed")
+            finally:
+                connection.close()
+
+
+class RedisBuffer:
+    """Buffer shared by every web and worker process through a Redis list."""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def push(self, event):
+        self._client.rpush(REDIS_KEY, json.dumps(event))
+
+    def drain(self, limit):
+        raw = self._client.lpop(REDIS_KEY, limit) or []
+        return [json.loads(item) for item in raw]
+
+    def requeue(self, events):
+        """Put drained events back at the head of the list, in their original order."""
+        if events:
+            self._client.lpush(REDIS_KEY, *(json.dumps(event) for event in reversed(events)))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            if settings.ACTIVITY_LOG_REDIS_URL:
+                _buffer = RedisBuffer(settings.ACTIVITY_LOG_REDIS_URL)
+            else:
+                _buffer = MemoryBuffer(settings.ACTIVITY_LOG_MAX_BUFFER, settings.ACTIVITY_LOG_FLUSH_INTERVAL)
+        return _buffer
+
+
+def log_activity(user, action, description='', ip_address=None):
+    """Record an activity event without touching the database."""
+    event = {
+        'user_id': user.pk if user is not None else None,
+        'action': action,
+        'description': description,
+        'ip_address': ip_address,
+        'timestamp': timezone.now().isoformat(),
+    }
+    try:
+        get_buffer().push(event)
+    except Exception:
+        # Auditing must never break the request it is describing
+        logger.exception("Could not buffer activity event %s", action)
+
+
+def flush_activity_log():
+    """Write buffered events to ActivityLog in batches; returns the number written."""
+    buffer = get_buffer()
+    batch_size = settings.ACTIVITY_LOG_BATCH_SIZE
+    written = 0
+    while True:
+        events = buffer.drain(batch_size)
+        if not events:
+            return written
+        try:
+            # Users deleted since the event was buffered are logged as anonymous (SET_NULL)
+            user_ids = {event['user_id'] for event in events if event['user_id']}
+            existing = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+            ActivityLog.objects.bulk_create([
+                ActivityLog(
+                    user_id=event['user_id'] if event['user_id'] in existing else None,
+                    action=event['action'],
+                    description=event['description'],
+                    ip_address=event['ip_address'],
+                    timestamp=parse_datetime(event['timestamp']),
+                )
+                for event in events
+            ], batch_size=batch_size)
+        except Exception:
+            # Keep the batch for the next flush rather than losing it
+            buffer.requeue(events)
+            raise
+        written += len(events)
+        if len(events) < batch_size:
+            return written
+
+
+def _archive(rows, cutoff):
+    """Write `rows` to gzipped JSON-lines files grouped by month."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row['timestamp'].strftime('%Y-%m'), []).append(row)
+
+    for month, month_rows in by_month.items():
+        lines = ''.join(json.dumps(row, default=str) + '\n' for row in month_rows)
+        # Each run writes its own member file so archives are never rewritten in place
+        name = f'activity_archive/{month}/activity-{cutoff:%Y%m%d%H%M%S}.jsonl.gz'
+        storages['archives'].save(name, ContentFile(gzip.compress(lines.encode())))
+
+
+def prune_activity_log(days=None, archive=True, batch_size=5000):
+    """
+    Roll rows older than `days` (ACTIVITY_LOG_RETENTION_DAYS) out of the table,
+    archiving them first unless `archive` is False. Deletes in primary-key
+    batches so the table is never locked for long. Returns the rows removed.
+    """
+    days = settings.ACTIVITY_LOG_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    old = ActivityLog.objects.filter(timestamp__lt=cutoff).order_by('id')
+
+    removed = 0
+    while True:
+        rows = list(
+            old.values('id', 'user_id', 'action', 'description', 'ip_address', 'timestamp')[:batch_size]
+        )
+        if not rows:
+            return removed
+        if archive:
+            _archive(rows, cutoff)
+        ActivityLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        removed += len(rows)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, WasteItem, SellerProfile, BuyerProfile, Transaction, Order, OrderItem, ShippingConfiguration, PickupStation, ActivityLog
+from .models import Category, WasteItem, SellerProfile, BuyerProfile, Transaction, Order, OrderItem, ShippingConfiguration, PickupStation, ActivityLog, Review, PendingEmail, ListingImportJob, ExportJob
 
 @admin.register(ActivityLog)
 class ActivityLogAdmin(admin.ModelAdmin):
@@ -76,4 +76,38 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'item', 'quantity', 'price')
-    search_fields = ('order__id', 'item__title')
\ No newline at end of file
+    search_fields = ('order__id', 'item__title')
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ('item', 'user', 'rating', 'created_at')
+    list_filter = ('rating', 'created_at')
+    search_fields = ('item__title', 'user__username', 'comment')
+    readonly_fields = ('item', 'user', 'rating')
+
+@admin.register(PendingEmail)
+class PendingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'attempts', 'created_at', 'updated_at')
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('subject', 'message', 'html_message', 'recipients', 'attempts', 'last_error', 'created_at', 'updated_at')
+
+@admin.register(ListingImportJob)
+class ListingImportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'status', 'processed_rows', 'total_rows', 'created_count', 'error_count', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'file', 'status', 'total_rows', 'processed_rows', 'created_count', 'error_count',
+                       'errors', 'message', 'created_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'format', 'since', 'until', 'status', 'row_count', 'created_at')
+    list_filter = ('kind', 'format', 'status', 'created_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'kind', 'format', 'since', 'until', 'status', 'file', 'row_count', 'message', 'created_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        return False
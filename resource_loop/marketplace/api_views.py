@@ -1,22 +1,105 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import mixins, viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.throttling import UserRateThrottle
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from .models import WasteItem, Category, Notification, OTP
-from .serializers import WasteItemSerializer, CategorySerializer, NotificationSerializer, OTPSerializer
-from .tasks import send_email_task
-import random
+from .models import WasteItem, Category, Notification, ListingImportJob
+from .serializers import WasteItemSerializer, WasteItemListSerializer, CategorySerializer, NotificationSerializer, OTPSerializer
+from .serializers import ListingImportJobSerializer
+from .renderers import ORJSONRenderer
+from .pagination import WasteItemCursorPagination
+from .conditional import API_CACHE_CONTROL, catalogue_state, conditional_response, queryset_state
+from .listing_import import ImportFileError, create_import
+from .mail_queue import queue_email
+from .otp_store import claim_resend, issue_otp, verify_otp
 import time
-from django.utils import timezone
 
 class OTPRateThrottle(UserRateThrottle):
     scope = 'otp'
 
 class MarketplaceViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = WasteItem.objects.all()
+    """
+    Read-only catalogue API.
+
+    Supports cursor pagination (?cursor=, ?page_size=), sparse fieldsets
+    (?fields=id,title,price) and filtering by ?category=<slug>, ?county=, ?condition=
+    and ?min_rating=.
+    """
+    queryset = WasteItem.objects.select_related('category', 'seller')
     serializer_class = WasteItemSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = WasteItemCursorPagination
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        category = params.get('category')
+        if category:
+            queryset = queryset.filter(category__slug=category)
+
+        county = params.get('county')
+        if county:
+            queryset = queryset.filter(county__iexact=county)
+
+        condition = params.get('condition')
+        if condition:
+            queryset = queryset.filter(condition=condition)
+
+        min_rating = params.get('min_rating')
+        if min_rating:
+            try:
+                queryset = queryset.filter(rating__gte=float(min_rating))
+            except ValueError:
+                pass
+
+        return queryset
+
+    def get_requested_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        return [f.strip() for f in fields.split(',') if f.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        render = self.fast_list
+        return conditional_response(
+            request, catalogue_state(), lambda: render(request, *args, **kwargs),
+            variant=request.get_full_path(), cache_control=API_CACHE_CONTROL,
+        )
+
+    def fast_list(self, request, *args, **kwargs):
+        """Serve list pages from `.values()` rows through WasteItemListSerializer."""
+        serializer = WasteItemListSerializer(
+            fields=self.get_requested_fields(), context=self.get_serializer_context()
+        )
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.columns)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        render = super().retrieve
+        try:
+            state = queryset_state(self.get_queryset().filter(pk=kwargs.get('pk')))
+        except (TypeError, ValueError, ValidationError):
+            state = None  # malformed pk; get_object() answers 404
+        if state and not state[1]:
+            state = None
+        return conditional_response(
+            request, state, lambda: render(request, *args, **kwargs),
+            variant=request.get_full_path(), cache_control=API_CACHE_CONTROL,
+        )
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
@@ -32,6 +115,30 @@ class NotificationViewSet(viewsets.ModelViewSet):
         notification.save()
         return Response({'status': 'marked as read'})
 
+class ListingImportViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Sellers upload a CSV/XLSX file of listings (multipart field `file`) and
+    poll the returned job for progress; rows are imported in the background.
+    """
+    serializer_class = ListingImportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def get_queryset(self):
+        return ListingImportJob.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        if not hasattr(request.user, 'sellerprofile'):
+            return Response({'error': 'Only sellers can import listings.'}, status=status.HTTP_403_FORBIDDEN)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = create_import(request.user, upload)
+        except ImportFileError as e:
+            return Response({'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
 class OTPViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
     throttle_classes = [OTPRateThrottle]
@@ -40,23 +147,22 @@ class OTPViewSet(viewsets.ViewSet):
     def resend(self, request):
         user = request.user
         
-        # Check cooldown (e.g., 1 minute)
-        last_otp = OTP.objects.filter(user=user).order_by('-created_at').first()
-        if last_otp and (timezone.now() - last_otp.created_at).total_seconds() < 60:
+        # Check cooldown (OTP_RESEND_COOLDOWN seconds)
+        if not claim_resend(user):
             return Response(
                 {'error': 'Please wait before requesting a new OTP.'}, 
                 status=status.HTTP_429_TOO_MANY_REQUESTS
             )
 
         # Generate new OTP
-        code = str(random.randint(100000, 999999))
-        OTP.objects.create(user=user, code=code)
+        code = issue_otp(user)
         
         # Send Email (Async)
-        send_email_task.delay(
+        queue_email(
             'Your Verification Code',
             f'Your new verification code is: {code}',
-            [user.email]
+            [user.email],
+            transient=True,
         )
         
         return Response({'status': 'OTP sent'})
@@ -65,15 +171,10 @@ class OTPViewSet(viewsets.ViewSet):
     def verify(self, request):
         serializer = OTPSerializer(data=request.data)
         if serializer.is_valid():
-            code = serializer.validated_data['code']
+            code = serializer.validated_data['otp']
             user = request.user
             
-            # Find valid OTP
-            otp = OTP.objects.filter(user=user, code=code, is_used=False).order_by('-created_at').first()
-            
-            if otp and otp.is_valid():
-                otp.is_used = True
-                otp.save()
+            if verify_otp(user, code):
                 user.is_active = True
                 user.save()
                 return Response({'status': 'Verified'})
@@ -7,3 +7,8 @@ class MarketplaceConfig(AppConfig):
 
     def ready(self):
         import marketplace.signals
+        import marketplace.task_monitoring
+        from django.conf import settings
+        if settings.PERFORMANCE_MONITORING:
+            from marketplace.middleware import instrument_cache_and_templates
+            instrument_cache_and_templates()
@@ -0,0 +1,139 @@
+"""
+Conditional GET support for catalogue pages and the items API.
+
+Validators are a (last_modified, token) pair, so unchanged pages are answered
+with a 304 before any rendering or serialization happens:
+
+- Single listings use an aggregate (MAX(updated_at), COUNT(id)) over the few
+  rows they are built from; the count catches deletions, which MAX(updated_at)
+  alone would miss.
+- Search and list pages use the catalogue version, a cache entry holding the
+  time of the last listing or category change (see bump_catalogue_version()),
+  so validating them never scans the filtered catalogue.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import WasteItem
+
+# Anonymous HTML must always revalidate: pages embed a per-visitor CSRF token
+# and cart badge, so shared caches may store them only behind the ETag check.
+HTML_CACHE_CONTROL = {'private': True, 'no_cache': True}
+# The items API is identical for every caller and can be cached by a CDN.
+API_CACHE_CONTROL = {'public': True, 'max_age': 60, 's_maxage': 300, 'stale_while_revalidate': 60}
+
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+
+
+def queryset_state(queryset):
+    """Return (last_modified, count) for the rows of `queryset`."""
+    state = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    return state['last_modified'], state['count']
+
+
+def bump_catalogue_version():
+    """Give every search and list page new validators after a listing or category change."""
+    cache.set(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+
+
+def catalogue_state():
+    """
+    (last_modified, version) for pages built from the catalogue as a whole.
+    A lost cache entry is replaced by a fresh, never-before-used version.
+    """
+    version = cache.get_or_set(CATALOGUE_VERSION_KEY, time.time_ns, None)
+    return datetime.fromtimestamp(version / 1e9, tz=timezone.utc), version
+
+
+def item_state(slug):
+    """
+    State for an item detail page: the item's category as a whole, since the page
+    also lists related items from it. Returns None when the item does not exist.
+    """
+    row = WasteItem.objects.filter(slug=slug).values_list('updated_at', 'category_id').first()
+    if row is None:
+        return None
+    updated_at, category_id = row
+    if category_id is None:
+        return updated_at, 1
+    return queryset_state(WasteItem.objects.filter(category_id=category_id))
+
+
+def make_etag(*parts):
+    digest = hashlib.md5('|'.join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _is_personalised(request):
+    """Logged-in pages and pages with pending flash messages are never answered with a 304."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return True
+    return len(get_messages(request)) > 0
+
+
+def _viewer_key(request):
+    # The guest cart badge is rendered into every page.
+    session = getattr(request, 'session', None)
+    cart = session.get('cart', {}) if session is not None else {}
+    return sorted(cart.items())
+
+
+def conditional_response(request, state, render, *, variant='', cache_control=None):
+    """
+    Answer `request` with a 304 if its validators match `state`, else call `render()`.
+
+    `state` is a (last_modified, token) tuple or None to skip conditional handling;
+    `variant` distinguishes responses built from the same rows (query string, page).
+    """
+    if request.method not in ('GET', 'HEAD') or state is None:
+        return render()
+
+    last_modified, token = state
+    etag = make_etag(variant, last_modified.isoformat() if last_modified else '', token)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+
+    if response.status_code in (200, 304):
+        if not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+        if timestamp and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, **(cache_control or HTML_CACHE_CONTROL))
+    return response
+
+
+def catalogue_conditional(state_func):
+    """
+    View decorator for anonymous catalogue pages.
+
+    `state_func(request, *args, **kwargs)` returns the (last_modified, token) the page
+    depends on. Authenticated visitors get the normal, uncached view.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if _is_personalised(request):
+                return view_func(request, *args, **kwargs)
+
+            response = conditional_response(
+                request,
+                state_func(request, *args, **kwargs),
+                lambda: view_func(request, *args, **kwargs),
+                variant=(request.get_full_path(), _viewer_key(request)),
+            )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,289 @@
+"""
+Synthetic, production-scale data for reproducing query plans and load locally.
+
+Each phase (users, items, orders, notifications) is cut into fixed-size chunks.
+A chunk's rows are generated from a random seed derived from the run seed and
+the chunk's start offset, so a run is reproducible whatever order the chunks
+finish in. Each chunk is written with bulk_create and then discarded, so
+memory stays flat however many rows are requested. With workers > 1, chunks
+are spread over a process pool. Every worker gets the id lookups of earlier
+phases once, through the pool initializer.
+
+bulk_create skips signals, so the caller rebuilds the derived tables (facet
+counts, login identifiers) once at the end.
+"""
+import multiprocessing
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.utils import timezone
+
+from .locations import KENYA_LOCATIONS
+from .models import BuyerProfile, Notification, Order, OrderItem, SellerProfile, Transaction, WasteItem
+
+COUNTIES = sorted(KENYA_LOCATIONS)
+
+# Rough share of marketplace activity: the big urban counties dominate
+COUNTY_BOOST = {'Mombasa': 10, 'Kiambu': 12, 'Nakuru': 8, 'Kisumu': 7, 'Uasin Gishu': 5, 'Machakos': 4, 'Kajiado': 4}
+COUNTY_WEIGHTS = [COUNTY_BOOST.get(county, 1) for county in COUNTIES]
+
+FIRST_NAMES = ['Wanjiru', 'Otieno', 'Achieng', 'Kamau', 'Mwangi', 'Njeri', 'Kiprop', 'Chebet', 'Omondi',
+               'Atieno', 'Mutua', 'Wambui', 'Kariuki', 'Jepkosgei', 'Odhiambo', 'Nyambura', 'Barasa', 'Akinyi']
+LAST_NAMES = ['Kimani', 'Ochieng', 'Mutiso', 'Korir', 'Wafula', 'Njoroge', 'Onyango', 'Kiptoo', 'Muthoni',
+              'Owino', 'Cheruiyot', 'Macharia', 'Wekesa', 'Nduta', 'Rotich', 'Juma']
+
+TITLES = {
+    'Electronics': ['E-Waste Motherboards', 'Used Laptop Batteries', 'LCD Screen Panels', 'Network Switches',
+                    'Computer Fans Lot', 'Server Rack Parts', 'Mobile Phone Boards'],
+    'Plastics': ['Plastic Pellets Regrind', 'PET Bottles Baled', 'HDPE Caps Bulk', 'LDPE Film Rolls', 'PP Crates'],
+    'Metals': ['Mixed Scrap Metal Batch', 'High-Grade Copper Wire', 'Aluminum Casing Offcuts', 'Steel Rebar Offcuts'],
+    'Paper': ['Baled Cardboard', 'Office Paper Shreds', 'Newsprint Bundles'],
+    'Glass': ['Clear Glass Cullet', 'Amber Bottles Crate', 'Window Glass Offcuts'],
+    'Organic': ['Coffee Husks', 'Sawdust Bags', 'Sugarcane Bagasse'],
+    'Textiles': ['Textile Offcuts (Cotton)', 'Denim Scraps Bundle', 'Mixed Fabric Rolls'],
+}
+GENERIC_TITLES = ['Mixed Recyclables Lot', 'Industrial Offcuts', 'Reclaimed Materials Bundle']
+
+CONDITIONS = ['new', 'refurbished', 'used', 'scrap']
+CONDITION_WEIGHTS = [5, 15, 55, 25]
+
+ORDER_STATUSES = ['delivered', 'shipped', 'processing', 'confirmed', 'placed', 'payment_pending', 'cancelled']
+ORDER_STATUS_WEIGHTS = [45, 10, 8, 10, 7, 8, 12]
+TRANSACTION_STATE = {'payment_pending': 'pending', 'cancelled': 'cancelled', 'placed': 'pending'}
+
+NOTIFICATIONS = [
+    ('Order Confirmed', 'Your order #{n} has been confirmed.', '/orders/'),
+    ('Order Shipped', 'Your order #{n} is on its way to your pickup station.', '/orders/'),
+    ('New Message', 'A seller replied to your enquiry.', None),
+    ('Price Drop', 'An item you viewed is now cheaper.', '/'),
+    ('Welcome', 'Welcome to ResourceLoop!', None),
+]
+
+# Lookups built by earlier phases; set in each worker by init_worker()
+_state = {}
+
+
+def chunk_rng(seed, start):
+    return random.Random(seed * 1_000_003 + start)
+
+
+def past_datetime(rng, now, days):
+    # Squaring skews timestamps towards the present, like real growth
+    return now - timedelta(days=days * rng.random() ** 2, seconds=rng.randrange(86400))
+
+
+def pick_location(rng):
+    county = rng.choices(COUNTIES, COUNTY_WEIGHTS)[0]
+    return county, rng.choice(KENYA_LOCATIONS[county])
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep generated created_at/date values instead of auto_now(_add)."""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+# --- Phases: each builds and saves one chunk, returning the rows created ----
+
+def build_users(prefix, start, count, seed, days):
+    rng = chunk_rng(seed, start)
+    now = timezone.now()
+    users, buyers, sellers = [], [], []
+    for n in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        users.append(User(
+            username=f'{prefix}-user-{n}',
+            email=f'{first.lower()}.{last.lower()}.{n}@{prefix}.example.com',
+            first_name=first,
+            last_name=last,
+            password=_state['password'],
+            date_joined=past_datetime(rng, now, days),
+        ))
+    User.objects.bulk_create(users)
+
+    for n, user in enumerate(users, start):
+        county, sub_county = pick_location(rng)
+        buyers.append(BuyerProfile(user=user, phone_number=f'2547{n % 10 ** 8:08d}', county=county,
+                                   sub_county=sub_county, location=county))
+        if rng.random() < _state['seller_share']:
+            sellers.append(SellerProfile(
+                user=user,
+                business_name=f'{user.last_name} Recyclers {n}',
+                is_verified=rng.random() < 0.3,
+                payment_number=f'2547{n % 10 ** 8:08d}',
+                county=county,
+                sub_county=sub_county,
+            ))
+    BuyerProfile.objects.bulk_create(buyers)
+    SellerProfile.objects.bulk_create(sellers)
+    return count
+
+
+def build_items(prefix, start, count, seed, days):
+    rng = chunk_rng(seed, start)
+    now = timezone.now()
+    sellers, seller_counties, verified = _state['sellers'], _state['seller_counties'], _state['seller_verified']
+    categories = _state['categories']
+    items = []
+    for n in range(start, start + count):
+        # A few sellers hold most of the listings
+        seller = int(rng.expovariate(5 / len(sellers))) % len(sellers)
+        category_id, category_name = rng.choice(categories)
+        title = rng.choice(TITLES.get(category_name, GENERIC_TITLES))
+        county = COUNTIES[seller_counties[seller]]
+        price = round(min(max(rng.lognormvariate(8.5, 1.1), 50), 2_000_000), 2)
+        created = past_datetime(rng, now, days)
+        items.append(WasteItem(
+            seller_id=sellers[seller],
+            category_id=category_id,
+            title=title,
+            slug=f'{prefix}-{n}',
+            description=f'Bulk lot: {title}. Suitable for recycling or refurbishment.',
+            specifications=f'Weight: ~{rng.randint(5, 500)}kg; Packaging: Bags/Boxes',
+            price=Decimal(str(price)),
+            old_price=Decimal(str(round(price * rng.uniform(1.05, 1.5), 2))) if rng.random() < 0.2 else None,
+            stock_quantity=str(rng.randint(1, 500)),
+            condition=rng.choices(CONDITIONS, CONDITION_WEIGHTS)[0],
+            location=county,
+            county=county,
+            sub_county=rng.choice(KENYA_LOCATIONS[county]),
+            is_verified_seller=bool(verified[seller]),
+            is_flash_sale=rng.random() < 0.05,
+            co2_saved_kg=round(rng.uniform(1.0, 500.0), 2),
+            created_at=created,
+            updated_at=created,
+        ))
+    with explicit_timestamps(WasteItem):
+        WasteItem.objects.bulk_create(items)
+    return count
+
+
+def build_orders(prefix, start, count, seed, days):
+    rng = chunk_rng(seed, start)
+    now = timezone.now()
+    buyers, item_ids, prices, stations = _state['buyers'], _state['items'], _state['prices'], _state['stations']
+    orders, lines = [], []
+    for n in range(start, start + count):
+        picks = [rng.randrange(len(item_ids)) for _ in range(rng.choices([1, 2, 3], [60, 30, 10])[0])]
+        order_lines = [(item_ids[i], rng.choices([1, 2, 5], [80, 15, 5])[0], prices[i]) for i in picks]
+        created = past_datetime(rng, now, days)
+        orders.append(Order(
+            user_id=rng.choice(buyers),
+            total_amount=Decimal(str(round(sum(qty * price for _, qty, price in order_lines), 2))),
+            status=rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+            pickup_station_id=rng.choice(stations) if stations else None,
+            created_at=created,
+            updated_at=created,
+        ))
+        lines.append(order_lines)
+
+    with explicit_timestamps(Order, Transaction):
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, item_id=item_id, quantity=qty, price=Decimal(str(price)))
+            for order, order_lines in zip(orders, lines)
+            for item_id, qty, price in order_lines
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(
+                user_id=order.user_id,
+                order=order,
+                item_id=order_lines[0][0],
+                mpesa_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'.upper(),
+                phone_number=f'2547{rng.randrange(10 ** 8):08d}',
+                amount=order.total_amount,
+                state=TRANSACTION_STATE.get(order.status, 'confirmed'),
+                merchant_request_id=f'{prefix}-{n}',
+                checkout_request_id=f'ws_CO_{prefix}_{n}',
+                mpesa_receipt_number=f'{prefix.upper()}{n}' if order.status not in TRANSACTION_STATE else None,
+                created_at=order.created_at,
+            )
+            for n, (order, order_lines) in enumerate(zip(orders, lines), start)
+        ])
+    return count
+
+
+def build_notifications(prefix, start, count, seed, days):
+    rng = chunk_rng(seed, start)
+    now = timezone.now()
+    users = _state['buyers']
+    notifications = []
+    for n in range(start, start + count):
+        title, message, link = rng.choice(NOTIFICATIONS)
+        notifications.append(Notification(
+            user_id=rng.choice(users),
+            title=title,
+            message=message.format(n=n),
+            link=link,
+            is_read=rng.random() < 0.7,
+            created_at=past_datetime(rng, now, days),
+        ))
+    with explicit_timestamps(Notification):
+        Notification.objects.bulk_create(notifications)
+    return count
+
+
+# --- Lookups shared with workers -------------------------------------------
+
+def load_lookups(prefix):
+    """Compact id arrays for the rows generated so far (8 bytes per id)."""
+    sellers = SellerProfile.objects.filter(user__username__startswith=f'{prefix}-user-').order_by('id')
+    county_index = {county: i for i, county in enumerate(COUNTIES)}
+    seller_rows = list(sellers.values_list('id', 'county', 'is_verified'))
+    item_ids, prices = array('q'), array('d')
+    items = WasteItem.objects.filter(slug__startswith=f'{prefix}-').order_by('id').values_list('id', 'price')
+    for item_id, price in items.iterator(chunk_size=10000):
+        item_ids.append(item_id)
+        prices.append(float(price))
+    return {
+        'buyers': array('q', User.objects.filter(username__startswith=f'{prefix}-user-')
+                        .order_by('id').values_list('id', flat=True).iterator(chunk_size=10000)),
+        'sellers': array('q', (row[0] for row in seller_rows)),
+        'seller_counties': array('H', (county_index.get(row[1], 0) for row in seller_rows)),
+        'seller_verified': array('b', (row[2] for row in seller_rows)),
+        'items': item_ids,
+        'prices': prices,
+    }
+
+
+def init_worker(state):
+    # Forked children must not reuse the parent's database sockets
+    connections.close_all()
+    _state.clear()
+    _state.update(state)
+
+
+def _run_chunk(job):
+    build, args = job
+    return build(*args)
+
+
+def run_phase(build, prefix, total, chunk_size, seed, days, workers, state, progress):
+    """Create `total` rows with `build` in chunks; calls progress(rows) as chunks finish."""
+    jobs = [(build, (prefix, start, min(chunk_size, total - start), seed, days)) for start in range(0, total, chunk_size)]
+    if workers <= 1:
+        _state.clear()
+        _state.update(state)
+        for job in jobs:
+            progress(_run_chunk(job))
+        return
+
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(workers, initializer=init_worker, initargs=(state,)) as pool:
+        for created in pool.imap_unordered(_run_chunk, jobs):
+            progress(created)
@@ -0,0 +1,263 @@
+"""
+CSV and Excel exports of orders, transactions and sales.
+
+Rows are read with values_list(...).iterator(chunk_size=EXPORT_CHUNK_SIZE), so
+neither path below holds more than one chunk in memory:
+
+- stream_csv() feeds a StreamingHttpResponse for on-the-spot CSV downloads.
+- run_export() (export_task) writes a gzipped CSV, or an XLSX workbook built
+  with openpyxl in write-only mode, to the `archives` storage for large date
+  ranges, then notifies the user with a download link. Prepared files are
+  deleted after EXPORT_RETENTION_DAYS by purge_exports().
+
+CSV files start with a UTF-8 byte order mark so Excel opens them with the right
+encoding. Orders and transactions are for admins; sellers export their own
+sales and admins export everyone's.
+"""
+import csv
+import gzip
+import io
+import logging
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ExportJob, Notification, Order, OrderItem, Transaction
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+STREAM_ROWS_PER_CHUNK = 500
+SOLD_STATUSES = ('confirmed', 'placed', 'processing', 'shipped', 'delivered')
+# Spreadsheets treat cells starting with these as formulas (CSV injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# kind -> (date field for since/until, [(column header, values_list lookup)])
+EXPORTS = {
+    'orders': ('created_at', [
+        ('Order', 'order_uuid'),
+        ('Date', 'created_at'),
+        ('Customer', 'user__username'),
+        ('Email', 'user__email'),
+        ('Status', 'status'),
+        ('Payment method', 'payment_method'),
+        ('Pickup station', 'pickup_station__name'),
+        ('Total (KES)', 'total_amount'),
+    ]),
+    'transactions': ('created_at', [
+        ('Date', 'created_at'),
+        ('User', 'user__username'),
+        ('M-Pesa name', 'mpesa_name'),
+        ('Phone', 'phone_number'),
+        ('Amount (KES)', 'amount'),
+        ('State', 'state'),
+        ('Receipt', 'mpesa_receipt_number'),
+        ('Checkout request', 'checkout_request_id'),
+        ('Order', 'order__order_uuid'),
+    ]),
+    'sales': ('order__created_at', [
+        ('Order', 'order__order_uuid'),
+        ('Date', 'order__created_at'),
+        ('Item', 'item__title'),
+        ('Seller', 'item__seller__business_name'),
+        ('Buyer', 'order__user__username'),
+        ('Quantity', 'quantity'),
+        ('Unit price (KES)', 'price'),
+        ('Line total (KES)', 'line_total'),
+        ('Status', 'order__status'),
+    ]),
+}
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() hands the formatted line back."""
+
+    def write(self, value):
+        return value
+
+
+def available_exports(user):
+    """Export kinds `user` may run."""
+    if user.is_superuser:
+        return list(EXPORTS)
+    if hasattr(user, 'sellerprofile'):
+        return ['sales']
+    return []
+
+
+def _queryset(kind, user):
+    if kind == 'orders':
+        return Order.objects.all()
+    if kind == 'transactions':
+        return Transaction.objects.all()
+    sales = OrderItem.objects.filter(order__status__in=SOLD_STATUSES).annotate(
+        line_total=ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    )
+    if not user.is_superuser:
+        sales = sales.filter(item__seller__user=user)
+    return sales
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, Decimal):
+        return f'{value:.2f}'
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _xlsx_value(value):
+    # Workbooks keep numbers and dates typed; openpyxl rejects aware datetimes
+    if isinstance(value, datetime):
+        return timezone.localtime(value).replace(tzinfo=None)
+    if isinstance(value, (str, int, float, Decimal)) or value is None:
+        return value
+    return str(value)
+
+
+def export_rows(kind, user, since=None, until=None, formatter=_format):
+    """Header row, then one row per record of `kind` visible to `user`, values passed through `formatter`."""
+    date_field, columns = EXPORTS[kind]
+    queryset = _queryset(kind, user)
+    if since:
+        queryset = queryset.filter(**{f'{date_field}__gte': timezone.make_aware(datetime.combine(since, time.min))})
+    if until:
+        queryset = queryset.filter(**{f'{date_field}__lt': timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))})
+    rows = queryset.order_by(date_field, 'pk').values_list(*(lookup for _header, lookup in columns))
+
+    yield [header for header, _lookup in columns]
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [formatter(value) for value in row]
+
+
+def stream_csv(rows):
+    """CSV text for a StreamingHttpResponse, a few hundred rows per chunk."""
+    writer = csv.writer(Echo())
+    lines = ['\ufeff']  # byte order mark, for Excel
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) >= STREAM_ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+def export_filename(kind, since=None, until=None, extension='csv'):
+    parts = [kind]
+    if since:
+        parts.append(f'from-{since:%Y%m%d}')
+    if until:
+        parts.append(f'to-{until:%Y%m%d}')
+    return '-'.join(parts) + '.' + extension
+
+
+def job_filename(job):
+    """Download name of a prepared export: gzipped CSV, or XLSX (already compressed)."""
+    name = export_filename(job.kind, job.since, job.until, job.format)
+    return name + '.gz' if job.format == 'csv' else name
+
+
+def _write_csv(job, tmp):
+    with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+        text = io.TextIOWrapper(gz, encoding='utf-8-sig', newline='')
+        writer = csv.writer(text)
+        for row in export_rows(job.kind, job.user, job.since, job.until):
+            writer.writerow(row)
+            job.row_count += 1
+        text.flush()
+        text.detach()  # leave closing `gz` to the with block
+
+
+def _write_xlsx(job, tmp):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    # write_only streams rows to a temporary file instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(job.get_kind_display())
+    for row in export_rows(job.kind, job.user, job.since, job.until, formatter=_xlsx_value):
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(sheet, value)
+            if isinstance(value, str) and value.startswith('='):
+                cell.data_type = 's'  # text, never a formula
+            cells.append(cell)
+        sheet.append(cells)
+        job.row_count += 1
+    workbook.save(tmp)
+
+
+def run_export(job):
+    """Write `job`'s rows to a file in storage and notify the user; always leaves it done or failed."""
+    job.status = 'running'
+    job.save(update_fields=['status'])
+    try:
+        with tempfile.TemporaryFile() as tmp:
+            if job.format == 'xlsx':
+                _write_xlsx(job, tmp)
+            else:
+                _write_csv(job, tmp)
+            tmp.seek(0)
+            job.row_count -= 1  # header
+            job.file.save(f'{job.user.username}/{job_filename(job)}', File(tmp), save=False)
+    except Exception as e:
+        logger.exception("Export #%s failed", job.pk)
+        job.status, job.message = 'failed', f'Export failed: {e}'
+    else:
+        job.status = 'done'
+        job.message = f'{job.row_count} rows'
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'row_count', 'message', 'finished_at'])
+
+    if job.status == 'done':
+        Notification.objects.create(
+            user=job.user,
+            title=f"Your {job.get_kind_display().lower()} export is ready",
+            message=f"{job.row_count} rows, available for {settings.EXPORT_RETENTION_DAYS} days.",
+            link=reverse('export_download', args=[job.pk]),
+        )
+    return job
+
+
+def start_export(job):
+    """
+    Run `job` on the bulk Celery queue, or in a background thread when tasks
+    run eagerly, so the request returns immediately either way.
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        def run():
+            try:
+                pending = ExportJob.objects.filter(pk=job.pk, status='pending').first()
+                if pending:
+                    run_export(pending)
+            finally:
+                connection.close()
+        transaction.on_commit(lambda: threading.Thread(target=run, name=f'export-{job.pk}', daemon=True).start())
+    else:
+        from .tasks import export_task
+        transaction.on_commit(lambda: export_task.delay(job.pk))
+
+
+def purge_exports(days=None):
+    """Delete prepared exports (and their files) older than `days`; returns how many."""
+    days = settings.EXPORT_RETENTION_DAYS if days is None else days
+    count = 0
+    for job in ExportJob.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
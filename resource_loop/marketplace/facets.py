@@ -0,0 +1,196 @@
+"""
+Faceted browsing over WasteItem.
+
+Per-facet listing counts for the whole catalogue are materialized in FacetCount and
+kept current incrementally by listing_changed_task, which the WasteItem save/delete
+signals queue once the change is committed. Filtered result sets
+are counted with a single GROUP BY over all facet columns, cached per query and
+invalidated whenever a listing's facets or searchable text change.
+"""
+import hashlib
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+
+from .conditional import bump_catalogue_version
+from .models import FacetCount, WasteItem
+
+# (key, label, lower bound inclusive, upper bound exclusive) in KES
+PRICE_BANDS = [
+    ('under-1k', 'Under KES 1,000', None, 1000),
+    ('1k-5k', 'KES 1,000 - 5,000', 1000, 5000),
+    ('5k-20k', 'KES 5,000 - 20,000', 5000, 20000),
+    ('20k-plus', 'Over KES 20,000', 20000, None),
+]
+
+VERIFIED_LABELS = {'yes': 'Verified sellers', 'no': 'Other sellers'}
+
+CACHE_TIMEOUT = 300
+VERSION_KEY = 'facets:version'
+
+
+def _price_band_q(lower, upper):
+    q = Q()
+    if lower is not None:
+        q &= Q(price__gte=lower)
+    if upper is not None:
+        q &= Q(price__lt=upper)
+    return q
+
+
+def price_band(price):
+    # Listings created straight from form data still hold the price as a string
+    price = Decimal(str(price))
+    for key, _label, lower, upper in PRICE_BANDS:
+        if (lower is None or price >= lower) and (upper is None or price < upper):
+            return key
+    return None
+
+
+# Model fields item_facets() reads
+FACET_FIELDS = ('category', 'county', 'condition', 'price', 'is_verified_seller')
+# Text fields a filtered (searched) queryset can match on, see views._search_queryset
+SEARCH_FIELDS = ('title', 'description')
+
+
+def item_facets(item):
+    """The facet values a listing contributes to, as {facet: value}."""
+    values = {
+        'category': str(item.category_id) if item.category_id else None,
+        'county': item.county or None,
+        'condition': item.condition or None,
+        'price_band': price_band(item.price) if item.price is not None else None,
+        'verified': 'yes' if item.is_verified_seller else 'no',
+    }
+    return {facet: value for facet, value in values.items() if value is not None}
+
+
+def apply_facet_filters(queryset, params):
+    """Filter `queryset` by the facet parameters present in `params` (a QueryDict)."""
+    county = params.get('county')
+    if county:
+        queryset = queryset.filter(county=county)
+
+    condition = params.get('condition')
+    if condition:
+        queryset = queryset.filter(condition=condition)
+
+    band = params.get('price_band')
+    for key, _label, lower, upper in PRICE_BANDS:
+        if band == key:
+            queryset = queryset.filter(_price_band_q(lower, upper))
+
+    verified = params.get('verified')
+    if verified in VERIFIED_LABELS:
+        queryset = queryset.filter(is_verified_seller=(verified == 'yes'))
+
+    return queryset
+
+
+def adjust_counts(old, new, invalidate=False):
+    """
+    Apply the difference between two item_facets() snapshots to FacetCount.
+    Cached filtered counts are dropped when a facet changed, or when
+    `invalidate` says the listing's searchable text did.
+    """
+    changed = invalidate
+    for facet in set(old) | set(new):
+        if old.get(facet) == new.get(facet):
+            continue
+        if facet in old:
+            _bump(facet, old[facet], -1)
+        if facet in new:
+            _bump(facet, new[facet], 1)
+        changed = True
+    # Saves that change neither (e.g. a stock update) keep the cache
+    if changed:
+        _invalidate()
+
+
+def count_new_items(items):
+    """Add bulk-created listings to FacetCount (bulk_create skips the save signals)."""
+    totals = Counter((facet, value) for item in items for facet, value in item_facets(item).items())
+    for (facet, value), delta in totals.items():
+        _bump(facet, value, delta)
+    _invalidate()
+
+
+def _bump(facet, value, delta):
+    rows = FacetCount.objects.filter(facet=facet, value=value)
+    if rows.update(count=F('count') + delta) or delta < 0:
+        return
+    FacetCount.objects.bulk_create([FacetCount(facet=facet, value=value, count=0)], ignore_conflicts=True)
+    rows.update(count=F('count') + delta)
+
+
+def _invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def _grouped_counts(queryset):
+    """Count `queryset` per facet value with one GROUP BY over every facet column."""
+    band = Case(
+        *[When(_price_band_q(lower, upper), then=Value(key)) for key, _label, lower, upper in PRICE_BANDS],
+        output_field=CharField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(price_band=band)
+        .values('category_id', 'county', 'condition', 'price_band', 'is_verified_seller')
+        .annotate(n=Count('id'))
+    )
+
+    counts = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        facets = {
+            'category': str(row['category_id']) if row['category_id'] else None,
+            'county': row['county'] or None,
+            'condition': row['condition'] or None,
+            'price_band': row['price_band'],
+            'verified': 'yes' if row['is_verified_seller'] else 'no',
+        }
+        for facet, value in facets.items():
+            if value is not None:
+                counts[facet][value] += row['n']
+    return {facet: dict(values) for facet, values in counts.items()}
+
+
+def facet_counts(queryset=None):
+    """
+    Return {facet: {value: count}}.
+
+    Without a queryset the materialized catalogue-wide counts are read; a filtered
+    queryset is grouped once and cached until the next listing change.
+    """
+    if queryset is None:
+        counts = defaultdict(dict)
+        for facet, value, count in FacetCount.objects.filter(count__gt=0).values_list('facet', 'value', 'count'):
+            counts[facet][value] = count
+        return dict(counts)
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    fingerprint = hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+    key = f'facets:{cache.get_or_set(VERSION_KEY, 1, None)}:{fingerprint}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = _grouped_counts(queryset)
+        cache.set(key, counts, CACHE_TIMEOUT)
+    return counts
+
+
+def rebuild_facet_counts(item_model=WasteItem, count_model=FacetCount):
+    """Recompute every FacetCount from scratch (e.g. after bulk .update() calls)."""
+    counts = _grouped_counts(item_model.objects.all())
+    count_model.objects.all().delete()
+    count_model.objects.bulk_create([
+        count_model(facet=facet, value=value, count=count)
+        for facet, values in counts.items()
+        for value, count in values.items()
+    ])
+    _invalidate()
+    bump_catalogue_version()
@@ -0,0 +1,80 @@
+"""
+Login identifier lookup.
+
+Every user's email, username and buyer phone number are mirrored, normalized,
+into UserIdentifier so the auth backend resolves whatever was typed into the
+login box with a single indexed query instead of case-insensitive scans.
+"""
+import re
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from mpesa.utils import format_phone_number
+
+from .models import BuyerProfile, UserIdentifier
+
+# Matching kinds are tried in this order, as the backend always has
+KIND_PRIORITY = {'email': 0, 'username': 1, 'phone': 2}
+
+
+def normalize_text(value):
+    return (value or '').strip().lower()
+
+
+def normalize_phone(value):
+    """Same 2547XXXXXXXX form that M-Pesa requests use, ignoring spaces and dashes."""
+    value = re.sub(r'[\s-]', '', value or '')
+    return format_phone_number(value) if value else ''
+
+
+def set_identifiers(user_id, kind, value):
+    """Make `value` the user's only identifier of `kind` (or remove it when empty)."""
+    rows = UserIdentifier.objects.filter(user_id=user_id, kind=kind)
+    if value and list(rows.values_list('value', flat=True)) == [value]:
+        return
+    rows.delete()
+    if value:
+        UserIdentifier.objects.create(user_id=user_id, kind=kind, value=value)
+
+
+def users_for_identifier(identifier):
+    """Users matching `identifier` as an email, username or phone number, best match first."""
+    candidates = {normalize_text(identifier), normalize_phone(identifier)} - {''}
+    if not candidates:
+        return []
+
+    rows = UserIdentifier.objects.filter(value__in=candidates).select_related('user')
+    users = {}
+    for row in sorted(rows, key=lambda r: KIND_PRIORITY[r.kind]):
+        users.setdefault(row.user_id, row.user)
+    return list(users.values())
+
+
+def rebuild_identifiers():
+    """
+    Recreate every identifier row; returns how many were written. Runs in one
+    transaction, so logins keep resolving against the old rows until the new
+    ones are committed, and a failure leaves the old rows in place.
+    """
+    rows, total = [], 0
+    with transaction.atomic():
+        phones = dict(BuyerProfile.objects.values_list('user_id', 'phone_number'))
+        UserIdentifier.objects.all().delete()
+        # Written in batches so millions of users never sit in memory at once
+        for user_id, email, username in User.objects.values_list('id', 'email', 'username').iterator(chunk_size=2000):
+            values = {
+                'email': normalize_text(email),
+                'username': normalize_text(username),
+                'phone': normalize_phone(phones.get(user_id)),
+            }
+            rows.extend(
+                UserIdentifier(user_id=user_id, kind=kind, value=value)
+                for kind, value in values.items() if value
+            )
+            if len(rows) >= 5000:
+                UserIdentifier.objects.bulk_create(rows, batch_size=1000)
+                total += len(rows)
+                rows = []
+        UserIdentifier.objects.bulk_create(rows, batch_size=1000)
+    return total + len(rows)
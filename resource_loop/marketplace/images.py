@@ -0,0 +1,161 @@
+"""
+Responsive image variants for listing photos and seller profile pictures.
+
+After an upload, process_image() (run by process_image_task) does the following:
+
+- Hashes the original. If another row of the same model already has that
+  content, it reuses that row's file and variants, and deletes the duplicate
+  upload.
+- Otherwise it applies the EXIF orientation and writes a clean copy of the
+  original without EXIF (GPS position, camera serial). It then renders one
+  JPEG and one WebP per width in IMAGE_VARIANT_WIDTHS, each no wider than the
+  original.
+
+Variants live under content-addressed names (variants/<hash>/<width>.<ext>),
+and the file names are stored in a JSON field:
+
+    {"source": "<original name>", "width": 1600, "height": 1200,
+     "jpeg": {"320": "variants/ab/ab12.../320.jpg", ...}, "webp": {...}}
+
+`source` records which upload the variants belong to, so replacing the image
+triggers a fresh run. The model properties built on variant_srcset() and
+variant_url() fall back to the original while variants are pending.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# model label -> (image field, variants field, hash field)
+IMAGE_FIELDS = {
+    'marketplace.wasteitem': ('image', 'image_variants', 'image_hash'),
+    'marketplace.sellerprofile': ('profile_image', 'profile_image_variants', 'profile_image_hash'),
+}
+
+FORMATS = {'jpeg': ('JPEG', 'jpg'), 'webp': ('WEBP', 'webp')}
+
+
+def variant_url(name):
+    return storages['default'].url(name)
+
+
+def variant_srcset(variants, fmt):
+    """`srcset` attribute value for one format, or '' when there are no variants yet."""
+    widths = (variants or {}).get(fmt) or {}
+    return ', '.join(f'{variant_url(name)} {width}w' for width, name in sorted(widths.items(), key=lambda w: int(w[0])))
+
+
+def smallest_variant_url(variants, fmt='jpeg', min_width=0):
+    """URL of the narrowest variant at least `min_width` wide (or the widest there is)."""
+    widths = sorted(((int(width), name) for width, name in ((variants or {}).get(fmt) or {}).items()))
+    if not widths:
+        return None
+    for width, name in widths:
+        if width >= min_width:
+            return variant_url(name)
+    return variant_url(widths[-1][1])
+
+
+def needs_processing(file, variants):
+    return bool(file) and (variants or {}).get('source') != file.name
+
+
+def _encode(image, fmt, quality):
+    pillow_format = FORMATS[fmt][0]
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel: flatten transparency onto white
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    # No exif= argument, so none of the original metadata is written
+    image.save(buffer, pillow_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _save(storage, name, content):
+    # Names are derived from the content hash, so an existing file is identical
+    if storage.exists(name):
+        return name
+    return storage.save(name, ContentFile(content))
+
+
+def render_variants(data, digest, source_name, storage):
+    """Write the EXIF-free original and every width/format; returns (source name, variants)."""
+    image = Image.open(BytesIO(data))
+    had_exif = bool(image.getexif())
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    prefix = f'variants/{digest[:2]}/{digest}'
+    quality = settings.IMAGE_VARIANT_QUALITY
+    if had_exif:
+        fmt = 'webp' if source_name.lower().endswith('.webp') else 'jpeg'
+        source_name = _save(storage, f'{prefix}/original.{FORMATS[fmt][1]}', _encode(image, fmt, 90))
+
+    variants = {'source': source_name, 'width': image.width, 'height': image.height}
+    widths = [w for w in settings.IMAGE_VARIANT_WIDTHS if w < image.width] or [image.width]
+    for fmt in settings.IMAGE_VARIANT_FORMATS:
+        variants[fmt] = {}
+        for width in widths:
+            resized = image
+            if width < image.width:
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            name = f'{prefix}/{width}.{FORMATS[fmt][1]}'
+            variants[fmt][str(width)] = _save(storage, name, _encode(resized, fmt, quality))
+    return source_name, variants
+
+
+def process_image(model_label, pk):
+    """Hash, dedupe, strip and resize one row's image; returns a short status string."""
+    field_name, variants_field, hash_field = IMAGE_FIELDS[model_label]
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=pk).first()
+    if obj is None:
+        return 'missing'
+    file = getattr(obj, field_name)
+    if not needs_processing(file, getattr(obj, variants_field)):
+        return 'up to date'
+
+    storage = file.storage
+    uploaded_name = file.name
+    with file.open('rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    # Writes only land if the row still holds the file that was processed
+    current = model.objects.filter(pk=pk, **{field_name: uploaded_name})
+
+    twin = (
+        model.objects.filter(**{hash_field: digest}).exclude(pk=pk).exclude(**{variants_field: {}})
+        .values(field_name, variants_field).first()
+    )
+    if twin:
+        source_name, variants, status = twin[field_name], twin[variants_field], 'deduplicated'
+    else:
+        try:
+            source_name, variants = render_variants(data, digest, uploaded_name, storage)
+        except (OSError, Image.DecompressionBombError) as e:
+            logger.warning("Could not process image %s of %s #%s: %s", uploaded_name, model_label, pk, e)
+            # Mark it handled so a broken upload is not retried on every save
+            if not current.update(**{variants_field: {'source': uploaded_name}, hash_field: digest}):
+                return 'superseded'
+            return 'unreadable'
+        status = 'processed'
+
+    # update() rather than save(): no signals, so no re-queueing and no facet churn
+    if not current.update(**{field_name: source_name, variants_field: variants, hash_field: digest}):
+        # A new photo was uploaded meanwhile; its own task handles it
+        return 'superseded'
+
+    if source_name != uploaded_name and not model.objects.filter(**{field_name: uploaded_name}).exists():
+        storage.delete(uploaded_name)
+    return status
@@ -0,0 +1,293 @@
+"""
+Bulk listing import from CSV or XLSX.
+
+run_import() streams the file row by row and validates each row against
+in-memory maps of categories, conditions and locations. Valid rows are
+inserted with bulk_create in batches of IMPORT_BATCH_SIZE, with slugs for the
+whole batch reserved at once (see marketplace.slugs). Progress is written to
+the ListingImportJob after every batch. bulk_create skips the save() signals,
+so facet counts and the seller's storefront cache are updated per batch, and
+related listings are refreshed by one batch task once the import is done.
+
+XLSX files are read with openpyxl in read-only mode, a row at a time.
+"""
+import csv
+import io
+import logging
+import math
+import os
+import threading
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .activity import log_activity
+from .conditional import bump_catalogue_version
+from .facets import count_new_items
+from .locations import KENYA_LOCATIONS
+from .models import Category, ListingImportJob, WasteItem
+from .slugs import allocate_slugs
+from .storefront import invalidate_storefront
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+
+# Accepted header spellings -> WasteItem field
+COLUMN_ALIASES = {
+    'title': 'title',
+    'name': 'title',
+    'description': 'description',
+    'specifications': 'specifications',
+    'specs': 'specifications',
+    'price': 'price',
+    'old_price': 'old_price',
+    'quantity': 'stock_quantity',
+    'stock': 'stock_quantity',
+    'stock_quantity': 'stock_quantity',
+    'condition': 'condition',
+    'category': 'category',
+    'county': 'county',
+    'sub_county': 'sub_county',
+    'subcounty': 'sub_county',
+    'co2_saved_kg': 'co2_saved_kg',
+}
+REQUIRED_COLUMNS = ('title', 'price', 'category', 'county')
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be imported."""
+
+
+def _normalise_header(value):
+    return COLUMN_ALIASES.get(str(value or '').strip().lower().replace(' ', '_').replace('-', '_'))
+
+
+def read_rows(file, filename):
+    """Yield (row number, {field: raw value}) from a CSV or XLSX file without loading it whole."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        rows = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    elif extension == '.xlsx':
+        from openpyxl import load_workbook
+        sheet = load_workbook(file, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+    else:
+        raise ImportFileError(f'Unsupported file type "{extension}"; use CSV or XLSX.')
+
+    header = [_normalise_header(value) for value in next(rows, [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ImportFileError(f'Missing required column(s): {", ".join(missing)}.')
+
+    for number, values in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in values):
+            continue
+        yield number, {field: value for field, value in zip(header, values) if field}
+
+
+def count_rows(file, filename):
+    """Data rows in the file, for the progress bar (a cheap pass for CSV)."""
+    if filename.lower().endswith('.csv'):
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        count = sum(1 for line in text if line.strip()) - 1
+        text.detach()  # otherwise closing the wrapper closes `file`
+    else:
+        count = sum(1 for _ in read_rows(file, filename))
+    file.seek(0)
+    return max(count, 0)
+
+
+class RowValidator:
+    """Turns raw rows into WasteItem kwargs using lookups loaded once per import."""
+
+    def __init__(self):
+        self.categories = {}
+        for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            self.categories[name.lower()] = category_id
+            self.categories[slug.lower()] = category_id
+            self.categories[str(category_id)] = category_id
+        self.conditions = {}
+        for key, label in WasteItem.CONDITION_CHOICES:
+            self.conditions[key] = key
+            self.conditions[label.lower()] = key
+        self.counties = {county.lower(): county for county in KENYA_LOCATIONS}
+        self.sub_counties = {
+            county: {sub.lower(): sub for sub in subs} for county, subs in KENYA_LOCATIONS.items()
+        }
+
+    def validate(self, raw):
+        """Return (kwargs, errors); errors maps column to message."""
+        text = {key: str(value).strip() if value is not None else '' for key, value in raw.items()}
+        errors, data = {}, {}
+
+        data['title'] = text.get('title', '')[:255]
+        if not data['title']:
+            errors['title'] = 'Title is required.'
+        data['description'] = text.get('description', '')
+        data['specifications'] = text.get('specifications', '')
+
+        for field, required in (('price', True), ('old_price', False)):
+            value = text.get(field, '').replace(',', '')
+            if not value:
+                if required:
+                    errors[field] = 'Price is required.'
+                data[field] = None
+                continue
+            try:
+                data[field] = Decimal(value)
+                if not data[field].is_finite():
+                    raise InvalidOperation
+                data[field] = data[field].quantize(Decimal('0.01'))
+            except InvalidOperation:
+                errors[field] = f'"{value}" is not a number.'
+                continue
+            if data[field] < 0 or data[field] >= Decimal('1e10'):
+                errors[field] = 'Price is out of range.'
+
+        data['stock_quantity'] = text.get('stock_quantity') or '1'
+        if len(data['stock_quantity']) > 10:
+            errors['stock_quantity'] = 'Quantity must be at most 10 characters.'
+
+        condition = text.get('condition', '').lower() or 'used'
+        data['condition'] = self.conditions.get(condition)
+        if data['condition'] is None:
+            errors['condition'] = f'Unknown condition "{text.get("condition")}".'
+
+        data['category_id'] = self.categories.get(text.get('category', '').lower())
+        if data['category_id'] is None:
+            errors['category'] = f'Unknown category "{text.get("category")}".'
+
+        county = self.counties.get(text.get('county', '').lower())
+        sub_county = None
+        if county is None:
+            errors['county'] = f'Unknown county "{text.get("county")}".'
+        elif text.get('sub_county'):
+            sub_county = self.sub_counties[county].get(text['sub_county'].lower())
+            if sub_county is None:
+                errors['sub_county'] = f'"{text["sub_county"]}" is not in {county}.'
+        data['county'] = county
+        data['sub_county'] = sub_county
+        data['location'] = f"{sub_county}, {county}" if sub_county else (county or 'Kenya')
+
+        if text.get('co2_saved_kg'):
+            try:
+                data['co2_saved_kg'] = float(text['co2_saved_kg'])
+                if not math.isfinite(data['co2_saved_kg']):
+                    raise ValueError
+            except ValueError:
+                errors['co2_saved_kg'] = 'CO2 saved must be a number.'
+
+        return data, errors
+
+
+def _insert_batch(seller, batch):
+    """bulk_create one batch of validated rows; returns the new ids."""
+    slugs = allocate_slugs([data['title'] for data in batch])
+    items = [
+        WasteItem(seller=seller, slug=slug, is_verified_seller=seller.is_verified, **data)
+        for data, slug in zip(batch, slugs)
+    ]
+    with transaction.atomic():
+        WasteItem.objects.bulk_create(items)
+        count_new_items(items)
+    invalidate_storefront(seller.pk)
+    bump_catalogue_version()
+    return [item.pk for item in items]
+
+
+def run_import(job):
+    """Import `job.file`; always leaves the job done or failed."""
+    job.status = 'running'
+    job.save(update_fields=['status'])
+    seller = job.user.sellerprofile
+    created_ids = []
+
+    try:
+        with job.file.open('rb') as file:
+            job.total_rows = count_rows(file, job.file.name)
+            ListingImportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+            validator = RowValidator()
+            batch = []
+            for number, raw in read_rows(file, job.file.name):
+                data, row_errors = validator.validate(raw)
+                job.processed_rows += 1
+                if row_errors:
+                    job.error_count += 1
+                    if len(job.errors) < MAX_REPORTED_ERRORS:
+                        job.errors.append({'row': number, 'errors': row_errors})
+                else:
+                    batch.append(data)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    created_ids += _insert_batch(seller, batch)
+                    job.created_count = len(created_ids)
+                    batch = []
+                    _save_progress(job)
+            if batch:
+                created_ids += _insert_batch(seller, batch)
+                job.created_count = len(created_ids)
+    except ImportFileError as e:
+        job.status, job.message = 'failed', str(e)
+    except Exception as e:
+        logger.exception("Listing import #%s failed", job.pk)
+        job.status, job.message = 'failed', f'Import stopped after {job.created_count} listings: {e}'
+    else:
+        job.status = 'done'
+        job.message = f'Imported {job.created_count} listings; {job.error_count} rows had errors.'
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'message', 'total_rows', 'processed_rows', 'created_count',
+                            'error_count', 'errors', 'finished_at'])
+    log_activity(job.user, 'create', f"Imported {job.created_count} listings from {os.path.basename(job.file.name)}")
+
+    # Related listings are normally refreshed by the save signal; one batch task,
+    # queued last, so it neither holds up the import nor floods the queue
+    if created_ids:
+        from .tasks import refresh_related_batch_task
+        refresh_related_batch_task.delay(created_ids)
+    return job
+
+
+def _save_progress(job):
+    ListingImportJob.objects.filter(pk=job.pk).update(
+        processed_rows=job.processed_rows,
+        created_count=job.created_count,
+        error_count=job.error_count,
+        errors=job.errors,
+    )
+
+
+def create_import(user, uploaded_file):
+    """Check the upload, save it as a pending job and queue it; returns the job."""
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ImportFileError(f'Unsupported file type "{extension}"; use CSV or XLSX.')
+    if uploaded_file.size > settings.LISTING_IMPORT_MAX_BYTES:
+        raise ImportFileError(f'Import files must be smaller than {settings.LISTING_IMPORT_MAX_BYTES // (1024 * 1024)} MB.')
+    job = ListingImportJob.objects.create(user=user, file=uploaded_file)
+    start_import(job)
+    return job
+
+
+def start_import(job):
+    """
+    Run `job` on the bulk Celery queue, or in a background thread when tasks
+    run eagerly, so the upload request returns immediately either way.
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        def run():
+            try:
+                pending = ListingImportJob.objects.filter(pk=job.pk, status='pending').first()
+                if pending:
+                    run_import(pending)
+            finally:
+                connection.close()
+        transaction.on_commit(lambda: threading.Thread(target=run, name=f'listing-import-{job.pk}', daemon=True).start())
+    else:
+        from .tasks import import_listings_task
+        transaction.on_commit(lambda: import_listings_task.delay(job.pk))
@@ -0,0 +1,208 @@
+"""
+Outgoing email that never runs inside the request/response cycle.
+
+With a Celery worker, queue_email() hands messages to send_email_task. When tasks
+run eagerly (CELERY_TASK_ALWAYS_EAGER, i.e. deployments without a worker) that
+would put the email provider's round trip back into the request, so messages go
+to a small in-process pool of delivery threads instead.
+
+The pool is bounded. A message that cannot be queued (backlog full), fails to
+send, or is still waiting when the process shuts down is saved as a
+PendingEmail and picked up later by `retry_pending_emails()`, for up to
+EMAIL_RETRY_MAX_AGE seconds.
+
+Transient messages (one-time codes) are never saved: their body is a secret
+and it is useless once the code expires, so an undelivered code is dropped and
+the user asks for a new one.
+"""
+import atexit
+import logging
+import queue
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def deliver(subject, message, recipient_list, html_message=None):
+    send_mail(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        recipient_list,
+        fail_silently=False,
+        html_message=html_message
+    )
+
+
+def persist(subject, message, recipient_list, html_message=None, transient=False, error=''):
+    """Save an undelivered message for the retry job (transient ones are dropped)."""
+    from .models import PendingEmail
+    if transient:
+        logger.warning("Dropping undelivered transient email %r to %s: %s", subject, recipient_list, error)
+        return
+    try:
+        PendingEmail.objects.create(
+            subject=subject,
+            message=message,
+            html_message=html_message or '',
+            recipients=list(recipient_list),
+            last_error=str(error),
+        )
+    except Exception:
+        logger.exception("Could not save undelivered email %r to %s", subject, recipient_list)
+
+
+class DeliveryQueue:
+    """A fixed pool of daemon threads draining a bounded queue of messages."""
+
+    def __init__(self, workers, max_size, shutdown_timeout):
+        self.shutdown_timeout = shutdown_timeout
+        self._queue = queue.Queue(maxsize=max_size)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f'email-delivery-{n}', daemon=True)
+            for n in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, payload):
+        """Queue `payload`; returns False if the queue is closed or full."""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            return False
+        return True
+
+    def _work(self):
+        me = threading.get_ident()
+        while True:
+            payload = self._queue.get()
+            if payload is _STOP:
+                break
+            with self._lock:
+                self._in_flight[me] = payload
+            try:
+                deliver(*payload[:4])
+            except Exception as e:
+                logger.warning("Email %r to %s failed, saving for retry: %s", payload[0], payload[2], e)
+                persist(*payload, error=e)
+            finally:
+                with self._lock:
+                    self._in_flight.pop(me, None)
+                connection.close()
+
+    def shutdown(self):
+        """
+        Stop accepting messages, persist everything still queued and give
+        in-flight deliveries `shutdown_timeout` seconds to finish.
+        """
+        self._closed = True
+        for payload in self._drain():
+            persist(*payload, error='Process shut down before delivery')
+
+        for _thread in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(self.shutdown_timeout)
+
+        # Deliveries that outlived the timeout are saved too; a duplicate
+        # email beats a lost order confirmation.
+        with self._lock:
+            stuck = list(self._in_flight.values())
+        for payload in stuck:
+            persist(*payload, error='Delivery still running at shutdown')
+
+    def _drain(self):
+        while True:
+            try:
+                payload = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if payload is not _STOP:
+                yield payload
+
+
+_delivery_queue = None
+_delivery_queue_lock = threading.Lock()
+
+
+def _get_delivery_queue():
+    # Started lazily so each (forked) server process gets its own threads
+    global _delivery_queue
+    with _delivery_queue_lock:
+        if _delivery_queue is None:
+            _delivery_queue = DeliveryQueue(
+                workers=settings.EMAIL_QUEUE_WORKERS,
+                max_size=settings.EMAIL_QUEUE_MAX_SIZE,
+                shutdown_timeout=settings.EMAIL_QUEUE_SHUTDOWN_TIMEOUT,
+            )
+            atexit.register(_delivery_queue.shutdown)
+        return _delivery_queue
+
+
+def queue_email(subject, message, recipient_list, html_message=None, bulk=False, transient=False):
+    """
+    Send an email in the background, via Celery when a worker is available.
+    Pass bulk=True for newsletters and other mass mail so they go to the `bulk`
+    queue instead of competing with transactional `notifications`, and
+    transient=True for one-time codes, which must never be saved for retry.
+    """
+    if not settings.CELERY_TASK_ALWAYS_EAGER:
+        from .tasks import send_email_task
+        send_email_task.apply_async(
+            (subject, message, recipient_list),
+            {'html_message': html_message, 'transient': transient},
+            queue='bulk' if bulk else None,
+        )
+        return
+
+    payload = (subject, message, list(recipient_list), html_message, transient)
+    if not _get_delivery_queue().put(payload):
+        logger.warning("Email delivery queue full, saving %r for retry", subject)
+        persist(*payload, error='Delivery queue full')
+
+
+def retry_pending_emails(limit=100, max_attempts=5):
+    """
+    Try to deliver saved messages; returns (sent, failed). Messages older than
+    EMAIL_RETRY_MAX_AGE are deleted instead. The rows being sent stay locked
+    (skip_locked), so overlapping runs never send the same message twice.
+    """
+    from .models import PendingEmail
+
+    cutoff = timezone.now() - timedelta(seconds=settings.EMAIL_RETRY_MAX_AGE)
+    expired, _ = PendingEmail.objects.filter(created_at__lt=cutoff).delete()
+    if expired:
+        logger.warning("Dropped %s pending emails older than %s seconds", expired, settings.EMAIL_RETRY_MAX_AGE)
+
+    sent = failed = 0
+    with transaction.atomic():
+        batch = (
+            PendingEmail.objects.select_for_update(skip_locked=True)
+            .filter(attempts__lt=max_attempts, created_at__gte=cutoff)[:limit]
+        )
+        for pending in batch:
+            try:
+                deliver(pending.subject, pending.message, pending.recipients, pending.html_message or None)
+            except Exception as e:
+                pending.attempts += 1
+                pending.last_error = str(e)
+                pending.save(update_fields=['attempts', 'last_error', 'updated_at'])
+                failed += 1
+            else:
+                pending.delete()
+                sent += 1
+    return sent, failed
@@ -0,0 +1,296 @@
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from marketplace.facets import rebuild_facet_counts
+from marketplace.models import BuyerProfile, Category, PickupStation, SellerProfile, WasteItem
+
+STEPS = ['browse', 'search', 'item_detail', 'add_to_cart', 'checkout', 'initiate_payment', 'mpesa_callback']
+
+TITLES = [
+    'Mixed Scrap Metal Batch', 'High-Grade Copper Wire', 'Aluminum Casing Offcuts',
+    'E-Waste Motherboards', 'Used Laptop Batteries', 'LCD Screen Panels', 'Plastic Pellets Regrind',
+    'PET Bottles Baled', 'HDPE Caps Bulk', 'Textile Offcuts Cotton', 'Denim Scraps Bundle',
+    'Seasoned Hardwood Pallets', 'Reclaimed Timber Boards', 'Network Switches', 'Computer Fans Lot',
+]
+SEARCH_TERMS = ['copper', 'scrap', 'plastic', 'timber', 'laptop', 'fabric', 'metal']
+COUNTIES = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Uasin Gishu', 'Kiambu', 'Nyeri']
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class DarajaStandIn:
+    """Replaces mpesa.utils.stk_push: answers like Daraja after a fixed delay, without the network."""
+
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000
+        self.count = 0
+
+    def __call__(self, amount, phone):
+        time.sleep(self.latency)
+        self.count += 1
+        return {
+            'MerchantRequestID': f'bench-{self.count}',
+            'CheckoutRequestID': f'ws_CO_BENCH_{self.count}',
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and benchmark the purchase funnel '
+        '(browse, search, item detail, add to cart, checkout, STK push, M-Pesa callback)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=5000, help='Listings to seed')
+        parser.add_argument('--sellers', type=int, default=50, help='Sellers to seed')
+        parser.add_argument('--users', type=int, default=20, help='Buyers driving the funnel')
+        parser.add_argument('--iterations', type=int, default=5, help='Funnel runs per buyer')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed funnel runs before measuring')
+        parser.add_argument('--stk-latency', type=float, default=0, help='Simulated Daraja STK push latency in ms')
+        parser.add_argument('--daraja-url', help='Send STK pushes over HTTP to this Daraja (e.g. run_daraja_simulator) '
+                                                 'instead of the in-process stand-in')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for a reproducible dataset and funnel')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'funnel_baseline.json'),
+                            help='Baseline file used by --save-baseline and --compare '
+                                 '(default: the committed benchmarks/funnel_baseline.json)')
+        parser.add_argument('--save-baseline', action='store_true', help='Write these results as the new baseline')
+        parser.add_argument('--compare', action='store_true', help='Fail if results regress against the baseline')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown for --compare (0.2 = 20%%)')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+
+        # Per-request and per-task INFO logging would dominate the timings
+        logging.disable(logging.INFO)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with override_settings(PERFORMANCE_MONITORING=False, CELERY_TASK_ALWAYS_EAGER=True):
+                from resource_loop.celery import app
+                app.conf.task_always_eager = True
+
+                started = time.perf_counter()
+                self.seed(options['items'], options['sellers'], options['users'])
+                self.stdout.write(f'Seeded {options["items"]} items, {options["sellers"]} sellers and '
+                                  f'{options["users"]} buyers in {time.perf_counter() - started:.1f}s')
+
+                if options['daraja_url']:
+                    with override_settings(MPESA_API_BASE_URL=options['daraja_url'].rstrip('/')):
+                        results = self.run_funnel(options)
+                else:
+                    with mock.patch('marketplace.views.stk_push', DarajaStandIn(options['stk_latency'])):
+                        results = self.run_funnel(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        self.report(results)
+
+        config = {key: options[key] for key in ('items', 'sellers', 'users', 'iterations', 'stk_latency', 'daraja_url', 'seed')}
+        config['database'] = connection.vendor
+        baseline_path = Path(options['baseline'])
+
+        if options['compare']:
+            self.compare(results, config, baseline_path, options['tolerance'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({'config': config, 'results': results}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+
+    # --- Dataset -----------------------------------------------------------
+
+    def seed(self, item_count, seller_count, buyer_count):
+        rng = self.rng
+        password = make_password('benchmark')
+
+        categories = Category.objects.bulk_create([
+            Category(name=name, slug=name.lower(), icon_class='fa-recycle')
+            for name in ('Metals', 'Electronics', 'Plastics', 'Textiles', 'Wood')
+        ])
+        for county in COUNTIES:
+            PickupStation.objects.create(name=f'{county} Hub', county=county, sub_county=county,
+                                         address='Benchmark station', shipping_fee=200)
+
+        seller_users = User.objects.bulk_create([
+            User(username=f'bench-seller-{n}', email=f'seller{n}@bench.local', password=password)
+            for n in range(seller_count)
+        ])
+        sellers = SellerProfile.objects.bulk_create([
+            SellerProfile(user=user, business_name=f'Bench Recycler {n}', is_verified=rng.random() < 0.3,
+                          county=rng.choice(COUNTIES))
+            for n, user in enumerate(seller_users)
+        ])
+
+        items = []
+        for n in range(item_count):
+            seller = rng.choice(sellers)
+            title = rng.choice(TITLES)
+            items.append(WasteItem(
+                seller=seller,
+                category=rng.choice(categories),
+                title=title,
+                slug=f'bench-{n}',
+                description=f'Bulk lot: {title}. Suitable for recycling or refurbishment.',
+                specifications='Weight: ~10-100kg; Packaging: Bags/Boxes',
+                price=round(rng.uniform(500, 50000), 2),
+                stock_quantity=str(rng.randint(50, 500)),
+                condition=rng.choice(['new', 'refurbished', 'used', 'scrap']),
+                county=seller.county,
+                location=seller.county,
+                is_verified_seller=seller.is_verified,
+                is_flash_sale=rng.random() < 0.1,
+            ))
+        WasteItem.objects.bulk_create(items, batch_size=1000)
+        rebuild_facet_counts()
+
+        buyers = User.objects.bulk_create([
+            User(username=f'bench-buyer-{n}', email=f'buyer{n}@bench.local', password=password)
+            for n in range(buyer_count)
+        ])
+        BuyerProfile.objects.bulk_create([
+            BuyerProfile(user=user, phone_number=f'2547{n:08d}', county=rng.choice(COUNTIES))
+            for n, user in enumerate(buyers)
+        ])
+
+    # --- Funnel ------------------------------------------------------------
+
+    def run_funnel(self, options):
+        buyers = list(User.objects.filter(username__startswith='bench-buyer-'))
+        slugs = list(WasteItem.objects.values_list('slug', flat=True))
+        stations = list(PickupStation.objects.values_list('id', flat=True))
+        samples = defaultdict(lambda: {'latency': [], 'queries': [], 'errors': 0})
+
+        for _ in range(options['warmup']):
+            self.funnel(Client(), buyers[0], slugs, stations, None)
+
+        started = time.perf_counter()
+        for buyer in buyers:
+            client = Client()
+            client.force_login(buyer)
+            for _ in range(options['iterations']):
+                self.funnel(client, buyer, slugs, stations, samples)
+        wall_time = time.perf_counter() - started
+
+        results = {}
+        for step in STEPS:
+            latency = sorted(samples[step]['latency'])
+            queries = samples[step]['queries']
+            results[step] = {
+                'requests': len(latency),
+                'errors': samples[step]['errors'],
+                'p50_ms': round(percentile(latency, 50), 2),
+                'p95_ms': round(percentile(latency, 95), 2),
+                'p99_ms': round(percentile(latency, 99), 2),
+                'mean_ms': round(sum(latency) / len(latency), 2) if latency else 0.0,
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0,
+                'requests_per_second': round(len(latency) / (sum(latency) / 1000), 1) if latency else 0.0,
+            }
+        funnels = len(buyers) * options['iterations']
+        results['funnel'] = {'runs': funnels, 'wall_seconds': round(wall_time, 2),
+                             'funnels_per_second': round(funnels / wall_time, 2) if wall_time else 0.0}
+        return results
+
+    def funnel(self, client, buyer, slugs, stations, samples):
+        if samples is None:
+            client.force_login(buyer)
+        slug = self.rng.choice(slugs)
+        item_id = WasteItem.objects.values_list('id', flat=True).get(slug=slug)
+
+        def hit(step, method, url, expected=(200, 302), **kwargs):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, **kwargs)
+                elapsed = (time.perf_counter() - start) * 1000
+            if samples is not None:
+                samples[step]['latency'].append(elapsed)
+                samples[step]['queries'].append(len(queries.captured_queries))
+                if response.status_code not in expected:
+                    samples[step]['errors'] += 1
+            return response
+
+        hit('browse', 'get', reverse('index'))
+        hit('search', 'get', reverse('search'), data={'q': self.rng.choice(SEARCH_TERMS)})
+        hit('item_detail', 'get', reverse('item_detail', args=[slug]))
+        hit('add_to_cart', 'post', reverse('add_to_cart', args=[item_id]), data={'quantity': 1})
+        hit('checkout', 'get', reverse('checkout'))
+        response = hit('initiate_payment', 'post', reverse('mpesa_stk_push'), expected=(200,),
+                       data={'phone_number': '0712345678', 'pickup_station_id': self.rng.choice(stations)})
+
+        checkout_request_id = response.json().get('CheckoutRequestID') if response.status_code == 200 else None
+        callback = {'Body': {'stkCallback': {
+            'MerchantRequestID': 'bench',
+            'CheckoutRequestID': checkout_request_id,
+            'ResultCode': 0,
+            'ResultDesc': 'The service request is processed successfully.',
+            'CallbackMetadata': {'Item': [
+                {'Name': 'Amount', 'Value': 1},
+                {'Name': 'MpesaReceiptNumber', 'Value': f'BENCH{self.rng.randint(100000, 999999)}'},
+                {'Name': 'PhoneNumber', 'Value': 254712345678},
+            ]},
+        }}}
+        hit('mpesa_callback', 'post', reverse('mpesa_callback'), expected=(200,),
+            data=json.dumps(callback), content_type='application/json')
+
+    # --- Reporting ---------------------------------------------------------
+
+    def report(self, results):
+        header = f'{"endpoint":<18}{"n":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>10}{"req/s":>10}{"errors":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for step in STEPS:
+            r = results[step]
+            line = (f'{step:<18}{r["requests"]:>6}{r["p50_ms"]:>10.2f}{r["p95_ms"]:>10.2f}{r["p99_ms"]:>10.2f}'
+                    f'{r["queries_per_request"]:>10.1f}{r["requests_per_second"]:>10.1f}{r["errors"]:>8}')
+            self.stdout.write(self.style.ERROR(line) if r['errors'] else line)
+        funnel = results['funnel']
+        self.stdout.write(f'{funnel["runs"]} funnels in {funnel["wall_seconds"]}s '
+                          f'({funnel["funnels_per_second"]} funnels/s)')
+
+    def compare(self, results, config, baseline_path, tolerance):
+        if not baseline_path.exists():
+            raise CommandError(f'No baseline at {baseline_path}; run with --save-baseline first.')
+        baseline = json.loads(baseline_path.read_text())
+        if baseline['config'] != config:
+            self.stdout.write(self.style.WARNING(f'Baseline was recorded with different settings: {baseline["config"]}'))
+
+        regressions = []
+        for step in STEPS:
+            old, new = baseline['results'].get(step), results[step]
+            if old is None:
+                continue
+            # Ignore sub-millisecond jitter on very fast endpoints
+            if new['p95_ms'] > old['p95_ms'] * (1 + tolerance) and new['p95_ms'] - old['p95_ms'] > 1:
+                regressions.append(f'{step}: p95 {old["p95_ms"]} -> {new["p95_ms"]} ms')
+            if new['queries_per_request'] > old['queries_per_request'] + 0.5:
+                regressions.append(f'{step}: queries {old["queries_per_request"]} -> {new["queries_per_request"]}')
+            if new['errors'] > old['errors']:
+                regressions.append(f'{step}: errors {old["errors"]} -> {new["errors"]}')
+
+        if regressions:
+            raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
@@ -0,0 +1,57 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from marketplace.models import WasteItem
+from marketplace.renderers import ORJSONRenderer
+from marketplace.serializers import WasteItemSerializer, WasteItemListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark WasteItemSerializer against the WasteItemListSerializer/orjson fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500, help='Number of items to serialize per run')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of timed runs per serializer')
+
+    def handle(self, *args, **options):
+        limit = options['items']
+        repeat = options['repeat']
+        request = RequestFactory().get('/api/items/', HTTP_HOST='localhost')
+        context = {'request': request}
+
+        def drf_path():
+            queryset = WasteItem.objects.select_related('category', 'seller')[:limit]
+            data = WasteItemSerializer(queryset, many=True, context=context).data
+            return JSONRenderer().render(data)
+
+        def fast_path():
+            serializer = WasteItemListSerializer(context=context)
+            rows = WasteItem.objects.values(*serializer.columns)[:limit]
+            return ORJSONRenderer().render(serializer.serialize(rows))
+
+        drf_output, fast_output = drf_path(), fast_path()
+        if json.loads(drf_output) != json.loads(fast_output):
+            self.stdout.write(self.style.ERROR('Payload mismatch between serializers.'))
+            return
+
+        count = len(json.loads(fast_output))
+        self.stdout.write(f'Serializing {count} items, {repeat} runs each...')
+
+        results = {}
+        for name, func in (('WasteItemSerializer + JSONRenderer', drf_path),
+                           ('WasteItemListSerializer + ORJSONRenderer', fast_path)):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = timings[len(timings) // 2]
+            self.stdout.write(f'{name}: median {results[name]:.2f} ms, best {timings[0]:.2f} ms')
+
+        baseline, fast = results.values()
+        self.stdout.write(self.style.SUCCESS(f'Payloads identical; fast path is {baseline / fast:.1f}x faster.'))
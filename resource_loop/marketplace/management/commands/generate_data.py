@@ -0,0 +1,89 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from marketplace import datagen
+from marketplace.facets import rebuild_facet_counts
+from marketplace.identity import rebuild_identifiers
+from marketplace.models import Category, PickupStation
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate production-scale synthetic users, listings, orders, transactions and notifications '
+        'with bulk inserts (run force_inject_data first for categories and pickup stations)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Users to create (every user gets a buyer profile)')
+        parser.add_argument('--seller-share', type=float, default=0.05, help='Share of users that are also sellers')
+        parser.add_argument('--items', type=int, default=50000, help='Listings to create')
+        parser.add_argument('--orders', type=int, default=20000, help='Orders to create, each with items and a transaction')
+        parser.add_argument('--notifications', type=int, default=50000, help='Notifications to create')
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many past days')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows generated and inserted per batch')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes (PostgreSQL only; SQLite allows one writer)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--prefix', default='gen', help='Prefix for generated usernames, slugs and payment ids')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-user-').exists():
+            raise CommandError(f'Data with prefix "{prefix}" already exists; pass a different --prefix.')
+
+        categories = list(Category.objects.values_list('id', 'name'))
+        if not categories and options['items']:
+            raise CommandError('No categories found; run force_inject_data first.')
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer; using one worker.'))
+            workers = 1
+
+        state = {
+            'password': make_password('password123'),
+            'seller_share': options['seller_share'],
+            'categories': categories,
+            'stations': list(PickupStation.objects.values_list('id', flat=True)),
+        }
+        phases = [
+            ('users', datagen.build_users, options['users']),
+            ('items', datagen.build_items, options['items']),
+            ('orders', datagen.build_orders, options['orders']),
+            ('notifications', datagen.build_notifications, options['notifications']),
+        ]
+        for name, build, total in phases:
+            if not total:
+                continue
+            if name != 'users':
+                state.update(datagen.load_lookups(prefix))
+                if name == 'items' and not state['sellers']:
+                    raise CommandError('No generated sellers to list items; raise --users or --seller-share.')
+                if name == 'orders' and not (state['buyers'] and state['items']):
+                    raise CommandError('Orders need generated users and items.')
+            self.run_phase(name, build, total, options, workers, state)
+
+        started = time.perf_counter()
+        rebuild_facet_counts()
+        identifiers = rebuild_identifiers()
+        self.stdout.write(f'Rebuilt facet counts and {identifiers} login identifiers in {time.perf_counter() - started:.1f}s')
+        self.stdout.write(self.style.SUCCESS('Data generation complete.'))
+
+    def run_phase(self, name, build, total, options, workers, state):
+        started = time.perf_counter()
+        done = 0
+
+        def progress(created):
+            nonlocal done
+            done += created
+            self.stdout.write(f'\r  {name}: {done}/{total}', ending='')
+            self.stdout.flush()
+
+        datagen.run_phase(build, options['prefix'], total, options['chunk_size'], options['seed'],
+                          options['days'], workers, state, progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'Created {total} {name} in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)'))
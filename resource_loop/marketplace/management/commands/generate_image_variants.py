@@ -0,0 +1,31 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from marketplace.images import IMAGE_FIELDS, needs_processing, process_image
+from marketplace.tasks import process_image_task
+
+
+class Command(BaseCommand):
+    help = 'Create resized, EXIF-free variants for listing and profile images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true', help='Process here instead of queueing Celery tasks')
+
+    def handle(self, *args, **options):
+        for label, (field_name, variants_field, _hash_field) in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            rows = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .only('pk', field_name, variants_field).iterator(chunk_size=500)
+            )
+            count = 0
+            for obj in rows:
+                if not needs_processing(getattr(obj, field_name), getattr(obj, variants_field)):
+                    continue
+                if options['sync']:
+                    process_image(label, obj.pk)
+                else:
+                    process_image_task.delay(label, obj.pk)
+                count += 1
+            verb = 'Processed' if options['sync'] else 'Queued'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {count} {model._meta.verbose_name_plural} images.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.activity import flush_activity_log, prune_activity_log
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered activity events, then archive and delete rows past the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Keep rows from the last N days (default: ACTIVITY_LOG_RETENTION_DAYS)')
+        parser.add_argument('--no-archive', action='store_true', help='Delete old rows without writing an archive')
+
+    def handle(self, *args, **options):
+        written = flush_activity_log()
+        removed = prune_activity_log(days=options['days'], archive=not options['no_archive'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed {written} buffered events; rolled over {removed} old rows.'))
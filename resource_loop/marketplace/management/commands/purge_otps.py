@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.otp_store import purge_otps
+
+
+class Command(BaseCommand):
+    help = 'Delete OTP audit records older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Keep records from the last N days (default: OTP_AUDIT_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        deleted = purge_otps(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} OTP records.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.facets import rebuild_facet_counts
+from marketplace.models import FacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized facet counts used by catalogue browsing'
+
+    def handle(self, *args, **options):
+        rebuild_facet_counts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {FacetCount.objects.count()} facet counts.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.identity import rebuild_identifiers
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the login identifier lookup table (e.g. after bulk-creating users)'
+
+    def handle(self, *args, **options):
+        count = rebuild_identifiers()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} login identifiers.'))
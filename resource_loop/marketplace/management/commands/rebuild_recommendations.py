@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.recommendations import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute item neighbours and per-user recommendations from order history'
+
+    def handle(self, *args, **options):
+        neighbours, candidates = rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {neighbours} item neighbours and {candidates} user recommendations.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.models import RelatedItem, WasteItem
+from marketplace.recommendations import refresh_related_items
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-items index for every listing'
+
+    def handle(self, *args, **options):
+        count = 0
+        for item in WasteItem.objects.order_by('created_at').iterator(chunk_size=500):
+            refresh_related_items(item)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} listings ({RelatedItem.objects.count()} related pairs).'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.reviews import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized item ratings from reviews and fix any drift'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled ratings for {fixed} items.'))
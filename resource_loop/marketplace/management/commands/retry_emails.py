@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.mail_queue import retry_pending_emails
+
+
+class Command(BaseCommand):
+    help = 'Retry emails that were saved after a failed or interrupted delivery'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Maximum number of emails to retry')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Skip emails that already failed this many times')
+
+    def handle(self, *args, **options):
+        sent, failed = retry_pending_emails(limit=options['limit'], max_attempts=options['max_attempts'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} pending emails ({failed} failed again).'))
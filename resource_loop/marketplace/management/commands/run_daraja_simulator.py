@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from mpesa.simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = 'Run a local mock of the Daraja API (OAuth, STK push and callbacks) for offline and load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=200, help='Mean STK push response time in ms')
+        parser.add_argument('--jitter', type=float, default=50, help='Standard deviation of the response time in ms')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of STK pushes rejected with a 500 (0-1)')
+        parser.add_argument('--cancel-rate', type=float, default=0.0, help='Share of callbacks reporting a cancelled payment (0-1)')
+        parser.add_argument('--callback-delay', type=float, default=2.0, help='Seconds between an STK push and its callback')
+        parser.add_argument('--callback-rate', type=float, default=50.0, help='Maximum callbacks sent per second (0 for no limit)')
+        parser.add_argument('--callback-workers', type=int, default=8, help='Threads sending callbacks')
+        parser.add_argument('--callback-url', help='Send every callback here instead of the CallBackURL in the request')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible latencies and outcomes')
+
+    def handle(self, *args, **options):
+        simulator = DarajaSimulator(
+            host=options['host'],
+            port=options['port'],
+            latency_ms=options['latency'],
+            jitter_ms=options['jitter'],
+            failure_rate=options['failure_rate'],
+            cancel_rate=options['cancel_rate'],
+            callback_delay=options['callback_delay'],
+            callback_rate=options['callback_rate'],
+            callback_workers=options['callback_workers'],
+            callback_url=options['callback_url'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Daraja simulator listening on {simulator.address}; set MPESA_API_BASE_URL={simulator.address}'
+        ))
+        try:
+            simulator.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.shutdown()
+            self.stdout.write(f'Stats: {simulator.snapshot()}')
@@ -4,7 +4,6 @@ from pathlib import Path
 from django.core.files import File
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from django.utils.text import slugify
 
 from marketplace.models import Category, WasteItem, SellerProfile
 from django.conf import settings
@@ -103,14 +102,10 @@ class Command(BaseCommand):
             reviews = random.randint(0, 200)
             is_flash = random.choice([True, False, False])
 
-            # Compose a unique slug to bypass model's seller.username reference
-            base_slug = slugify(f"{title}-{seller.user.username}-{random.randint(1000,9999)}")
-
             item = WasteItem(
                 seller=seller,
                 category=category,
                 title=title,
-                slug=base_slug,
                 description=f"Bulk lot: {title}. Suitable for recycling or refurbishment.",
                 specifications="Weight: ~10-100kg; Purity varies; Packaging: Bags/Boxes",
                 price=price,
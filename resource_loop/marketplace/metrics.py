@@ -0,0 +1,117 @@
+"""
+In-process metrics registry with a Prometheus text exposition view.
+
+Counters and histograms are kept per process (one registry per gunicorn or
+Celery worker), so scrape each process or aggregate downstream. The /metrics
+endpoint is only routed when METRICS_ENABLED is set, and requires
+METRICS_TOKEN as a bearer token when one is configured.
+"""
+import hmac
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._types[name] = kind
+        self._help[name] = help_text
+
+    def add_collector(self, collect):
+        """Register `collect()`, called at scrape time and yielding (name, labels, value) gauges."""
+        self._collectors.append(collect)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            index = bisect_left(hist['buckets'], value)
+            if index < len(buckets):
+                hist['counts'][index] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def render(self):
+        """Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(hist, counts=list(hist['counts'])) for key, hist in self._histograms.items()}
+
+        series = defaultdict(list)
+        for (name, labels), value in sorted(counters.items()):
+            series[name].append(f'{name}{_labels(labels)} {value:g}')
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    series[name].append(f'{name}{_labels(tuple(sorted(labels.items())))} {value:g}')
+            except Exception:
+                logger.exception("Metrics collector %r failed", collect)
+        for (name, labels), hist in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(hist['buckets'], hist['counts']):
+                cumulative += count
+                series[name].append(f'{name}_bucket{_labels(labels + (("le", f"{bound:g}"),))} {cumulative}')
+            series[name].append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {hist["count"]}')
+            series[name].append(f'{name}_sum{_labels(labels)} {hist["sum"]:g}')
+            series[name].append(f'{name}_count{_labels(labels)} {hist["count"]}')
+
+        lines = []
+        for name in sorted(series):
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {self._types[name]}')
+            lines.extend(series[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+registry = Registry()
+
+registry.describe('http_requests_total', 'counter', 'HTTP requests by view, method and status.')
+registry.describe('http_request_duration_seconds', 'histogram', 'Wall time per request.')
+registry.describe('http_request_db_queries_total', 'counter', 'SQL queries executed while serving requests.')
+registry.describe('http_request_db_seconds_total', 'counter', 'Time spent in SQL while serving requests.')
+registry.describe('http_request_render_seconds_total', 'counter', 'Time spent rendering templates.')
+registry.describe('http_request_cache_total', 'counter', 'Cache lookups while serving requests, by result.')
+registry.describe('http_request_n_plus_one_total', 'counter', 'Requests that repeated one SQL statement suspiciously often.')
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied, token):
+            return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
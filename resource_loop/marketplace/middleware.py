@@ -0,0 +1,170 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware records, per URL name: wall time, SQL query count and
+time (via connection.execute_wrapper), cache hits/misses and template render
+time. Each request emits one JSON log line on the `marketplace.performance`
+logger, feeds the metrics registry, and is flagged when a single SQL statement
+repeats PERFORMANCE_N_PLUS_ONE_THRESHOLD times or more (a likely N+1).
+
+Cache and template timings come from wrappers installed once by
+instrument_cache_and_templates(), called from MarketplaceConfig.ready().
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+
+logger = logging.getLogger('marketplace.performance')
+
+_current = ContextVar('request_profile', default=None)
+_MISSING = object()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PERFORMANCE_MONITORING or request.path.startswith(settings.PERFORMANCE_IGNORE_PATHS):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - start
+
+        self.record(request, response, profile, duration)
+        return response
+
+    def record(self, request, response, profile, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        labels = {'view': view, 'method': request.method, 'status': response.status_code}
+
+        registry.inc('http_requests_total', **labels)
+        registry.observe('http_request_duration_seconds', duration, view=view)
+        registry.inc('http_request_db_queries_total', profile.queries, view=view)
+        registry.inc('http_request_db_seconds_total', profile.db_time, view=view)
+        registry.inc('http_request_render_seconds_total', profile.render_time, view=view)
+        registry.inc('http_request_cache_total', profile.cache_hits, view=view, result='hit')
+        registry.inc('http_request_cache_total', profile.cache_misses, view=view, result='miss')
+
+        repeated = [
+            (sql, count) for sql, count in profile.statements.most_common(3)
+            if count >= settings.PERFORMANCE_N_PLUS_ONE_THRESHOLD
+        ]
+        if repeated:
+            registry.inc('http_request_n_plus_one_total', view=view)
+
+        event = {
+            'event': 'request',
+            'view': view,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 2),
+            'render_ms': round(profile.render_time * 1000, 2),
+            'cache_hits': profile.cache_hits,
+            'cache_misses': profile.cache_misses,
+        }
+        if repeated:
+            event['n_plus_one'] = [{'sql': sql[:200], 'count': count} for sql, count in repeated]
+
+        slow = duration * 1000 >= settings.PERFORMANCE_SLOW_REQUEST_MS
+        logger.log(logging.WARNING if (slow or repeated) else logging.INFO, json.dumps(event))
+
+
+def _count_cache_get(get):
+    def wrapper(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        profile = _current.get()
+        if profile is not None:
+            if value is _MISSING:
+                profile.cache_misses += 1
+            else:
+                profile.cache_hits += 1
+        return default if value is _MISSING else value
+    return wrapper
+
+
+def _count_cache_get_many(get_many):
+    def wrapper(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version=version)
+        profile = _current.get()
+        if profile is not None:
+            profile.cache_hits += len(values)
+            profile.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def instrument_cache_and_templates():
+    """Wrap cache lookups and Django template rendering so requests can account for them."""
+    from django.core.cache import CacheHandler
+    from django.template.backends.django import Template
+
+    if getattr(CacheHandler, '_performance_instrumented', False):
+        return
+    CacheHandler._performance_instrumented = True
+
+    create_connection = CacheHandler.create_connection
+
+    def create_instrumented_connection(self, alias):
+        cache = create_connection(self, alias)
+        cache.get = _count_cache_get(cache.get)
+        cache.get_many = _count_cache_get_many(cache.get_many)
+        return cache
+
+    CacheHandler.create_connection = create_instrumented_connection
+
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context, request)
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.render_time += time.perf_counter() - start
+
+    Template.render = timed_render
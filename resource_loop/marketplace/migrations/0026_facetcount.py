@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:56
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def populate_facet_counts(apps, schema_editor):
+    WasteItem = apps.get_model('marketplace', 'WasteItem')
+    FacetCount = apps.get_model('marketplace', 'FacetCount')
+
+    bands = [('under-1k', 1000), ('1k-5k', 5000), ('5k-20k', 20000)]
+    counts = Counter()
+    for row in WasteItem.objects.values('category_id', 'county', 'condition', 'price', 'is_verified_seller').iterator():
+        if row['category_id']:
+            counts[('category', str(row['category_id']))] += 1
+        if row['county']:
+            counts[('county', row['county'])] += 1
+        if row['condition']:
+            counts[('condition', row['condition'])] += 1
+        band = next((key for key, upper in bands if row['price'] < upper), '20k-plus')
+        counts[('price_band', band)] += 1
+        counts[('verified', 'yes' if row['is_verified_seller'] else 'no')] += 1
+
+    FacetCount.objects.bulk_create([
+        FacetCount(facet=facet, value=value, count=count) for (facet, value), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0025_pickupstation_shipping_fee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('category', 'Category'), ('county', 'County'), ('condition', 'Condition'), ('price_band', 'Price Band'), ('verified', 'Verified Seller')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='uniq_facet_value')],
+            },
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
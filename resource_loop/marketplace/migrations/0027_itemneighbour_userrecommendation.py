@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0026_facetcount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='marketplace.wasteitem')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='marketplace.wasteitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', '-score'], name='marketplace_item_id_321fd5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'neighbour'), name='uniq_item_neighbour')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_recommendations', to='marketplace.wasteitem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-score'], name='marketplace_user_id_4f0c33_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'item'), name='uniq_user_recommendation')],
+            },
+        ),
+    ]
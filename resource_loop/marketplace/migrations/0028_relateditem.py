@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0027_itemneighbour_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='marketplace.wasteitem')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='marketplace.wasteitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', '-score'], name='marketplace_item_id_d66193_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'related'), name='uniq_related_item')],
+            },
+        ),
+    ]
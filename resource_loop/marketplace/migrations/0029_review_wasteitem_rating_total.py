@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+
+def init_rating_total(apps, schema_editor):
+    # Keep existing averages consistent with the new running total.
+    WasteItem = apps.get_model('marketplace', 'WasteItem')
+    WasteItem.objects.update(rating_total=Cast(Round(F('rating') * F('reviews_count')), IntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0028_relateditem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.PositiveSmallIntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')])),
+                ('comment', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='wasteitem',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0, help_text='Sum of all review ratings (running aggregate)'),
+        ),
+        migrations.AddIndex(
+            model_name='wasteitem',
+            index=models.Index(fields=['-rating'], name='wasteitem_rating_idx'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='marketplace.wasteitem'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('item', 'user'), name='uniq_review_per_user'),
+        ),
+        migrations.RunPython(init_rating_total, migrations.RunPython.noop),
+    ]
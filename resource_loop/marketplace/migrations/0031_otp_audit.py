@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0030_pendingemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='otp',
+            name='code',
+            field=models.CharField(blank=True, max_length=6),
+        ),
+        migrations.AlterField(
+            model_name='otp',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
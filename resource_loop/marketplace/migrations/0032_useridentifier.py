@@ -0,0 +1,72 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:04
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copies of marketplace.identity's normalizers, so later changes to the
+# app code cannot change what this migration writes
+def normalize_text(value):
+    return (value or '').strip().lower()
+
+
+def normalize_phone(value):
+    value = re.sub(r'[\s-]', '', value or '')
+    if not value:
+        return ''
+    if value.startswith('+254'):
+        return value[1:]
+    if value.startswith('0'):
+        return '254' + value[1:]
+    return value
+
+
+def populate_identifiers(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserIdentifier = apps.get_model('marketplace', 'UserIdentifier')
+    BuyerProfile = apps.get_model('marketplace', 'BuyerProfile')
+
+    phones = dict(BuyerProfile.objects.values_list('user_id', 'phone_number'))
+    rows = []
+    for user_id, email, username in User.objects.values_list('id', 'email', 'username').iterator(chunk_size=2000):
+        values = {
+            'email': normalize_text(email),
+            'username': normalize_text(username),
+            'phone': normalize_phone(phones.get(user_id)),
+        }
+        rows.extend(
+            UserIdentifier(user_id=user_id, kind=kind, value=value)
+            for kind, value in values.items() if value
+        )
+        if len(rows) >= 5000:
+            UserIdentifier.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    UserIdentifier.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0031_otp_audit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserIdentifier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('email', 'Email'), ('username', 'Username'), ('phone', 'Phone')], max_length=10)),
+                ('value', models.CharField(max_length=254)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identifiers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['value'], name='useridentifier_value_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'kind', 'value'), name='uniq_user_identifier')],
+            },
+        ),
+        migrations.RunPython(populate_identifiers, migrations.RunPython.noop),
+    ]
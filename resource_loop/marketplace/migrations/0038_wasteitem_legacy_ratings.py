@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:42
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def init_legacy_ratings(apps, schema_editor):
+    # Whatever the aggregates hold beyond the Review rows predates them
+    WasteItem = apps.get_model('marketplace', 'WasteItem')
+    Review = apps.get_model('marketplace', 'Review')
+    stats = {
+        row['item_id']: (row['total'], row['n'])
+        for row in Review.objects.values('item_id').annotate(total=Sum('rating'), n=Count('id'))
+    }
+    items = []
+    for item in WasteItem.objects.filter(reviews_count__gt=0).only('id', 'rating_total', 'reviews_count'):
+        total, count = stats.get(item.pk, (0, 0))
+        item.legacy_rating_total = max(item.rating_total - total, 0)
+        item.legacy_reviews_count = max(item.reviews_count - count, 0)
+        items.append(item)
+    WasteItem.objects.bulk_update(items, ['legacy_rating_total', 'legacy_reviews_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0037_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasteitem',
+            name='legacy_rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wasteitem',
+            name='legacy_reviews_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(init_legacy_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0038_wasteitem_legacy_ratings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wasteitem',
+            index=models.Index(fields=['-created_at', '-id'], name='wasteitem_created_idx'),
+        ),
+    ]
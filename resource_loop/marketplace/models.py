@@ -1,4 +1,5 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.urls import reverse
@@ -6,6 +7,9 @@ from django.utils import timezone
 import uuid
 import random
 
+from .images import smallest_variant_url, variant_srcset
+from .slugs import new_slug
+
 class ShippingConfiguration(models.Model):
     same_county_fee = models.DecimalField(max_digits=10, decimal_places=2, default=200.00, help_text="Fee when buyer and seller are in the same county")
     different_county_fee = models.DecimalField(max_digits=10, decimal_places=2, default=500.00, help_text="Fee when buyer and seller are in different counties")
@@ -25,14 +29,13 @@ class ShippingConfiguration(models.Model):
 
 class OTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='otps')
-    code = models.CharField(max_length=6)
-    created_at = models.DateTimeField(auto_now_add=True)
+    code = models.CharField(max_length=6, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     is_used = models.BooleanField(default=False)
     attempts = models.IntegerField(default=0)
 
     def is_valid(self):
-        # Valid for 5 minutes
-        return not self.is_used and (timezone.now() - self.created_at).total_seconds() < 300
+        return not self.is_used and (timezone.now() - self.created_at).total_seconds() < settings.OTP_TTL
 
     def __str__(self):
         return f"OTP for {self.user.username}"
@@ -51,6 +54,120 @@ class Notification(models.Model):
     def __str__(self):
         return f"Notification for {self.user.username}: {self.title}"
 
+class PendingEmail(models.Model):
+    """An email that could not be delivered yet; retried by the `retry_emails` command."""
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    html_message = models.TextField(blank=True)
+    recipients = models.JSONField(default=list)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)}"
+
+class UploadSession(models.Model):
+    """
+    A listing photo uploaded outside the listing form, straight to Cloudinary
+    or in resumable chunks to local storage. The form only submits its token.
+    """
+    BACKEND_CHOICES = [
+        ('cloudinary', 'Cloudinary direct upload'),
+        ('local', 'Chunked upload to local storage'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+    ]
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    backend = models.CharField(max_length=20, choices=BACKEND_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # Storage name (Cloudinary public_id or local path) once the upload completes
+    name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.status}) by {self.user.username}"
+
+def archive_storage():
+    # Spreadsheets are not images, so they cannot go to the Cloudinary media storage
+    from django.core.files.storage import storages
+    return storages['archives']
+
+class ListingImportJob(models.Model):
+    """A CSV/XLSX file of listings imported in the background by import_listings_task."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listing_imports')
+    file = models.FileField(upload_to='listing_imports/', storage=archive_storage)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # First rows that failed validation: [{"row": 12, "errors": {"price": "..."}}]
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import #{self.pk} by {self.user.username} ({self.status})"
+
+    @property
+    def progress(self):
+        if not self.total_rows:
+            return 100 if self.status in ('done', 'failed') else 0
+        return min(100, int(100 * self.processed_rows / self.total_rows))
+
+class ExportJob(models.Model):
+    """A gzipped CSV or XLSX export written to the archives storage by export_task."""
+    KIND_CHOICES = [
+        ('orders', 'Orders'),
+        ('transactions', 'Transactions'),
+        ('sales', 'Sales'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+    ]
+    STATUS_CHOICES = ListingImportJob.STATUS_CHOICES
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exports')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES, default='csv')
+    since = models.DateField(null=True, blank=True)
+    until = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='exports/', storage=archive_storage, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} export #{self.pk} by {self.user.username} ({self.status})"
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
@@ -98,6 +215,8 @@ class WasteItem(models.Model):
     
     # Visuals & Trust
     image = models.ImageField(upload_to='items/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies, see marketplace.images")
+    image_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     is_verified_seller = models.BooleanField(default=False)
     is_flash_sale = models.BooleanField(default=False)
     
@@ -106,16 +225,25 @@ class WasteItem(models.Model):
     
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0)
     reviews_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0, help_text="Sum of all review ratings (running aggregate)")
+    # Ratings carried over from before Review rows existed; reconcile_ratings adds Review on top
+    legacy_rating_total = models.PositiveIntegerField(default=0)
+    legacy_reviews_count = models.PositiveIntegerField(default=0)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-rating'], name='wasteitem_rating_idx'),
+            # Keyset pagination (newest first) walks this index page by page
+            models.Index(fields=['-created_at', '-id'], name='wasteitem_created_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(f"{self.title}-{self.seller.user.username}")
+            self.slug = new_slug(self.title)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -137,6 +265,107 @@ class WasteItem(models.Model):
             return int(((self.old_price - self.price) / self.old_price) * 100)
         return 0
 
+    @property
+    def image_srcset(self):
+        return variant_srcset(self.image_variants, 'jpeg')
+
+    @property
+    def image_webp_srcset(self):
+        return variant_srcset(self.image_variants, 'webp')
+
+    @property
+    def thumbnail_url(self):
+        """Smallest JPEG variant, falling back to the original until variants exist."""
+        if not self.image:
+            return None
+        return smallest_variant_url(self.image_variants) or self.image.url
+
+class FacetCount(models.Model):
+    """Materialized number of listings per facet value, maintained by WasteItem signals."""
+    FACET_CHOICES = [
+        ('category', 'Category'),
+        ('county', 'County'),
+        ('condition', 'Condition'),
+        ('price_band', 'Price Band'),
+        ('verified', 'Verified Seller'),
+    ]
+
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='uniq_facet_value')
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+class ItemNeighbour(models.Model):
+    """Precomputed item-to-item recommendation (co-purchase or same category)."""
+    item = models.ForeignKey(WasteItem, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(WasteItem, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'neighbour'], name='uniq_item_neighbour')
+        ]
+        indexes = [models.Index(fields=['item', '-score'])]
+
+    def __str__(self):
+        return f"{self.item_id} -> {self.neighbour_id} ({self.score})"
+
+class UserRecommendation(models.Model):
+    """Precomputed recommendation candidate for a user, rebuilt offline from order history."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations')
+    item = models.ForeignKey(WasteItem, on_delete=models.CASCADE, related_name='user_recommendations')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'item'], name='uniq_user_recommendation')
+        ]
+        indexes = [models.Index(fields=['user', '-score'])]
+
+    def __str__(self):
+        return f"{self.item_id} for {self.user_id} ({self.score})"
+
+class RelatedItem(models.Model):
+    """Precomputed content similarity between two listings, shown on the item detail page."""
+    item = models.ForeignKey(WasteItem, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(WasteItem, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'related'], name='uniq_related_item')
+        ]
+        indexes = [models.Index(fields=['item', '-score'])]
+
+    def __str__(self):
+        return f"{self.item_id} ~ {self.related_id} ({self.score})"
+
+class Review(models.Model):
+    RATING_CHOICES = [(i, str(i)) for i in range(1, 6)]
+
+    item = models.ForeignKey(WasteItem, on_delete=models.CASCADE, related_name='reviews')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
+    rating = models.PositiveSmallIntegerField(choices=RATING_CHOICES)
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'user'], name='uniq_review_per_user')
+        ]
+
+    def __str__(self):
+        return f"{self.rating}/5 for {self.item.title} by {self.user.username}"
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -184,11 +413,51 @@ class SellerProfile(models.Model):
     county = models.CharField(max_length=100, blank=True, null=True)
     sub_county = models.CharField(max_length=100, blank=True, null=True)
     profile_image = models.ImageField(upload_to='seller_profiles/', blank=True, null=True)
+    profile_image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    profile_image_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     description = models.TextField(blank=True, help_text="About the seller")
 
     def __str__(self):
         return self.business_name
 
+    @property
+    def profile_image_srcset(self):
+        return variant_srcset(self.profile_image_variants, 'jpeg')
+
+    @property
+    def profile_image_webp_srcset(self):
+        return variant_srcset(self.profile_image_variants, 'webp')
+
+    @property
+    def profile_thumbnail_url(self):
+        if not self.profile_image:
+            return None
+        return smallest_variant_url(self.profile_image_variants, min_width=300) or self.profile_image.url
+
+class UserIdentifier(models.Model):
+    """
+    Normalized login identifiers (lowercased email and username, 254XXXXXXXXX phone)
+    so any of them resolves with one indexed lookup. Kept in sync by signals.
+    """
+    KIND_CHOICES = [
+        ('email', 'Email'),
+        ('username', 'Username'),
+        ('phone', 'Phone'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='identifiers')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.CharField(max_length=254)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'value'], name='uniq_user_identifier'),
+        ]
+        indexes = [models.Index(fields=['value'], name='useridentifier_value_idx')]
+
+    def __str__(self):
+        return f"{self.kind}: {self.value}"
+
 
 class Transaction(models.Model):
     STATE_CHOICES = [
@@ -293,7 +562,8 @@ class ActivityLog(models.Model):
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     description = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered row is inserted
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         ordering = ['-timestamp']
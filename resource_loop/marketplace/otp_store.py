@@ -0,0 +1,95 @@
+"""
+One-time verification codes, kept in the `otp` cache (Redis in production).
+
+Each user has at most one live code, stored as an HMAC under `otp:<user_id>`
+and expired by the cache's own TTL, so verifying is a single key lookup and
+nothing accumulates in the database. Failed guesses are counted with an atomic
+increment and the code is burned after OTP_MAX_ATTEMPTS. Resends are rate
+limited with an add-if-absent cooldown key.
+
+With OTP_AUDIT_TO_DB the OTP model still records when codes were issued and
+used (never the code itself); `purge_otps` trims those rows.
+"""
+import hashlib
+import hmac
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import OTP
+
+
+def _cache():
+    return caches[settings.OTP_CACHE_ALIAS]
+
+
+def _code_key(user_id):
+    return f'otp:{user_id}'
+
+
+def _attempts_key(user_id):
+    return f'otp-attempts:{user_id}'
+
+
+def _cooldown_key(user_id):
+    return f'otp-cooldown:{user_id}'
+
+
+def _digest(user_id, code):
+    message = f'{user_id}:{code}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def issue_otp(user):
+    """Generate a new code for `user`, replacing any previous one, and return it."""
+    code = f'{secrets.randbelow(1000000):06d}'
+    cache = _cache()
+    cache.set(_code_key(user.pk), _digest(user.pk, code), settings.OTP_TTL)
+    cache.delete(_attempts_key(user.pk))
+    cache.set(_cooldown_key(user.pk), 1, settings.OTP_RESEND_COOLDOWN)
+
+    if settings.OTP_AUDIT_TO_DB:
+        OTP.objects.create(user=user, code='')
+    return code
+
+
+def claim_resend(user):
+    """True if `user` may request a new code now (starts the cooldown)."""
+    return _cache().add(_cooldown_key(user.pk), 1, settings.OTP_RESEND_COOLDOWN)
+
+
+def verify_otp(user, code):
+    """Check `code` against the user's live code; a correct code can only be used once."""
+    cache = _cache()
+    code_key, attempts_key = _code_key(user.pk), _attempts_key(user.pk)
+
+    stored = cache.get(code_key)
+    if stored is None:
+        return False
+
+    cache.add(attempts_key, 0, settings.OTP_TTL)
+    if cache.incr(attempts_key) > settings.OTP_MAX_ATTEMPTS:
+        cache.delete_many([code_key, attempts_key])
+        return False
+
+    if not hmac.compare_digest(stored, _digest(user.pk, str(code))):
+        return False
+
+    # Whoever deletes the key consumes the code, so concurrent submits can't both pass
+    if not cache.delete(code_key):
+        return False
+    cache.delete(attempts_key)
+
+    if settings.OTP_AUDIT_TO_DB:
+        OTP.objects.filter(user=user, is_used=False).update(is_used=True)
+    return True
+
+
+def purge_otps(days=None):
+    """Delete OTP audit rows older than `days` (OTP_AUDIT_RETENTION_DAYS by default)."""
+    days = settings.OTP_AUDIT_RETENTION_DAYS if days is None else days
+    deleted, _ = OTP.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class WasteItemCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the items API, ordered newest first.
+    Each page is a bounded indexed range scan on created_at, so deep pages
+    cost the same as the first one and large catalogues are walked page by page.
+    """
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids an exact COUNT(*) on every page view.
+
+    On PostgreSQL the planner's row estimate is used for large results; small
+    results (and other databases) get an exact count cached per query fingerprint.
+    """
+    exact_count_threshold = 1000
+    count_cache_timeout = 300
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        connection = connections[queryset.db]
+
+        if connection.vendor == 'postgresql':
+            estimate = self._planner_estimate(queryset, connection)
+            if estimate >= self.exact_count_threshold:
+                return estimate
+
+        key = f'paginator-count:{self._fingerprint(queryset)}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    @staticmethod
+    def _fingerprint(queryset):
+        sql, params = queryset.query.sql_with_params()
+        return hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+
+    @staticmethod
+    def _planner_estimate(queryset, connection):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    """A page produced by KeysetPaginator; iterates like a Django Page."""
+
+    number = None
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        return KeysetPaginator.encode_cursor(self.object_list[-1]) if self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return KeysetPaginator.encode_cursor(self.object_list[0]) if self.object_list else None
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over (created_at, id) descending.
+
+    Pages are addressed by an opaque cursor taken from the first or last row of the
+    neighbouring page, so page N costs one index range scan instead of OFFSET N.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @staticmethod
+    def encode_cursor(obj):
+        raw = f'{obj.created_at.isoformat()}|{obj.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        if created_at is None:
+            return None
+        return created_at, pk
+
+    def page(self, after=None, before=None):
+        after = self.decode_cursor(after) if after else None
+        before = self.decode_cursor(before) if before else None
+
+        if before:
+            created_at, pk = before
+            rows = list(
+                self.queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                .order_by('created_at', 'id')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page][::-1], has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset.order_by('-created_at', '-id')
+        if after:
+            created_at, pk = after
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], has_next=len(rows) > self.per_page, has_previous=bool(after))
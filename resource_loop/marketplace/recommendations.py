@@ -0,0 +1,229 @@
+"""
+Offline item recommendations.
+
+`rebuild_recommendations()` turns OrderItem history into two compact tables:
+ItemNeighbour (per-item co-purchase neighbours, topped up with same-category
+listings) and UserRecommendation (per-user candidate lists). Dashboards then
+read a user's recommendations with one indexed query.
+
+Related items for detail pages are content based: RelatedItem rows score listings
+by shared title/specification tokens, category, county and price band. They are
+refreshed per listing when it changes and cached per item.
+"""
+import random
+import re
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .facets import price_band
+from .models import ItemNeighbour, OrderItem, RelatedItem, UserRecommendation, WasteItem
+
+PAID_STATUSES = ['confirmed', 'placed', 'processing', 'shipped', 'delivered']
+MAX_NEIGHBOURS = 10
+MAX_CANDIDATES = 20
+CATEGORY_SCORE = 0.1  # below a single co-purchase, so history always wins
+COLD_START_POOL = 50  # newest in-stock listings cold-start users are sampled from
+
+
+def _purchase_baskets():
+    """Yield (user_id, set of item ids) per paid order, streamed from the database."""
+    rows = (
+        OrderItem.objects.filter(order__status__in=PAID_STATUSES, item__isnull=False)
+        .values_list('order_id', 'order__user_id', 'item_id')
+        .order_by('order_id')
+        .iterator(chunk_size=2000)
+    )
+    current, user_id, basket = None, None, set()
+    for order_id, order_user_id, item_id in rows:
+        if order_id != current:
+            if basket:
+                yield user_id, basket
+            current, user_id, basket = order_id, order_user_id, set()
+        basket.add(item_id)
+    if basket:
+        yield user_id, basket
+
+
+def _compute_neighbours(baskets):
+    co_purchases = defaultdict(Counter)
+    for basket in baskets:
+        for a, b in combinations(sorted(basket), 2):
+            co_purchases[a][b] += 1
+            co_purchases[b][a] += 1
+
+    # Same-category listings fill up items with little or no purchase history
+    by_category = defaultdict(list)
+    items = WasteItem.objects.filter(stock_quantity__gt=0).values_list('id', 'category_id').order_by('-created_at')
+    for item_id, category_id in items.iterator(chunk_size=2000):
+        if category_id:
+            by_category[category_id].append(item_id)
+
+    neighbours = {}
+    for category_id, item_ids in by_category.items():
+        fallback = item_ids[:MAX_NEIGHBOURS + 1]
+        for item_id in item_ids:
+            scores = Counter(co_purchases.get(item_id, {}))
+            for other in fallback:
+                if other != item_id and other not in scores:
+                    scores[other] = CATEGORY_SCORE
+            neighbours[item_id] = scores.most_common(MAX_NEIGHBOURS)
+    for item_id, scores in co_purchases.items():
+        neighbours.setdefault(item_id, scores.most_common(MAX_NEIGHBOURS))
+    return neighbours
+
+
+def rebuild_recommendations():
+    """Recompute ItemNeighbour and UserRecommendation from order history."""
+    purchases = defaultdict(set)
+    baskets = []
+    for user_id, basket in _purchase_baskets():
+        purchases[user_id] |= basket
+        baskets.append(basket)
+
+    neighbours = _compute_neighbours(baskets)
+
+    own_items = defaultdict(set)
+    for user_id, item_id in WasteItem.objects.values_list('seller__user_id', 'id').iterator(chunk_size=2000):
+        own_items[user_id].add(item_id)
+
+    user_rows = []
+    for user_id, bought in purchases.items():
+        candidates = Counter()
+        for item_id in bought:
+            for other, score in neighbours.get(item_id, ()):
+                if other not in bought and other not in own_items[user_id]:
+                    candidates[other] += score
+        user_rows.extend(
+            UserRecommendation(user_id=user_id, item_id=item_id, score=score)
+            for item_id, score in candidates.most_common(MAX_CANDIDATES)
+        )
+
+    neighbour_rows = [
+        ItemNeighbour(item_id=item_id, neighbour_id=other, score=score)
+        for item_id, scored in neighbours.items()
+        for other, score in scored
+    ]
+
+    with transaction.atomic():
+        ItemNeighbour.objects.all().delete()
+        ItemNeighbour.objects.bulk_create(neighbour_rows, batch_size=1000)
+        UserRecommendation.objects.all().delete()
+        UserRecommendation.objects.bulk_create(user_rows, batch_size=1000)
+    return len(neighbour_rows), len(user_rows)
+
+
+def recommended_items_for(user, limit=4):
+    """
+    Top precomputed recommendations for `user`, topped up for cold-start users
+    with a random pick from the COLD_START_POOL newest in-stock listings.
+    """
+    available = WasteItem.objects.filter(stock_quantity__gt=0).exclude(seller__user=user).select_related('category')
+
+    items = list(
+        available.filter(user_recommendations__user=user)
+        .order_by('-user_recommendations__score')[:limit]
+    )
+    if len(items) < limit:
+        # A bounded walk of the created_at index, shuffled here, not ORDER BY RANDOM()
+        pool = list(
+            available.exclude(id__in=[i.id for i in items])
+            .order_by('-created_at', '-id').values_list('id', flat=True)[:COLD_START_POOL]
+        )
+        picked = random.sample(pool, min(limit - len(items), len(pool)))
+        fill = available.in_bulk(picked)
+        items += [fill[pk] for pk in picked if pk in fill]
+    return items
+
+
+# --- Related items ---------------------------------------------------------
+
+MAX_RELATED = 8
+RELATED_CANDIDATES = 200
+RELATED_CACHE_TIMEOUT = 60 * 60 * 24
+STOPWORDS = {'the', 'and', 'for', 'with', 'used', 'new', 'lot', 'bulk', 'assorted', 'mixed'}
+
+
+def _tokens(item):
+    text = f"{item.title} {item.specifications}".lower()
+    return {t for t in re.findall(r'[a-z0-9]+', text) if len(t) > 2 and t not in STOPWORDS}
+
+
+def similarity(a, b, a_tokens=None, b_tokens=None):
+    a_tokens = _tokens(a) if a_tokens is None else a_tokens
+    b_tokens = _tokens(b) if b_tokens is None else b_tokens
+    union = a_tokens | b_tokens
+    score = 2.0 * len(a_tokens & b_tokens) / len(union) if union else 0.0
+    if a.category_id and a.category_id == b.category_id:
+        score += 1.0
+    if a.county and a.county == b.county:
+        score += 0.5
+    if price_band(a.price) == price_band(b.price):
+        score += 0.5
+    return score
+
+
+def _related_cache_key(item_id):
+    return f'related-items:{item_id}'
+
+
+def refresh_related_items(item):
+    """
+    Recompute `item`'s related listings against recent candidates, and rescore
+    `item` in the lists of its new neighbours and of every listing that already
+    showed it (kept at MAX_RELATED). Other rows in those lists are left alone.
+    """
+    fields = ('id', 'title', 'specifications', 'category_id', 'county', 'price')
+    candidates = WasteItem.objects.exclude(pk=item.pk).only(*fields)
+    if item.category_id:
+        candidates = candidates.filter(category_id=item.category_id)
+    candidates = list(candidates.order_by('-created_at')[:RELATED_CANDIDATES])
+
+    # Listings whose lists show `item` today, possibly outside the candidates
+    holder_ids = set(RelatedItem.objects.filter(related=item).values_list('item_id', flat=True))
+    seen = {other.pk for other in candidates}
+    candidates += list(WasteItem.objects.filter(pk__in=holder_ids - seen).only(*fields))
+
+    item_tokens = _tokens(item)
+    scores = {other.pk: similarity(item, other, item_tokens) for other in candidates}
+    scored = sorted(
+        ((score, pk) for pk, score in scores.items() if pk in seen and score > 0),
+        reverse=True,
+    )[:MAX_RELATED]
+    # similarity() is symmetric, so each affected list gets `item` at the same score
+    reverse = {pk: scores[pk] for _score, pk in scored}
+    reverse.update((pk, scores[pk]) for pk in holder_ids if scores.get(pk, 0) > 0)
+
+    with transaction.atomic():
+        RelatedItem.objects.filter(item=item).delete()
+        RelatedItem.objects.filter(related=item, item_id__in=holder_ids | set(reverse)).delete()
+        RelatedItem.objects.bulk_create(
+            [RelatedItem(item_id=item.pk, related_id=pk, score=score) for score, pk in scored]
+            + [RelatedItem(item_id=pk, related_id=item.pk, score=score) for pk, score in reverse.items()]
+        )
+        # Only lists that gained `item` can have grown past MAX_RELATED
+        for pk in set(reverse) - holder_ids:
+            keep = RelatedItem.objects.filter(item_id=pk).order_by('-score').values_list('id', flat=True)[:MAX_RELATED]
+            RelatedItem.objects.filter(item_id=pk).exclude(id__in=list(keep)).delete()
+
+    cache.delete_many([_related_cache_key(pk) for pk in {item.pk} | holder_ids | set(reverse)])
+
+
+def related_items_for(item, limit=4):
+    """Related listings for a detail page: cached ids, then a single primary-key lookup."""
+    key = _related_cache_key(item.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            RelatedItem.objects.filter(item=item).order_by('-score').values_list('related_id', flat=True)[:MAX_RELATED]
+        )
+        cache.set(key, ids, RELATED_CACHE_TIMEOUT)
+
+    if not ids:
+        # Not indexed yet: fall back to the newest listings in the same category
+        return list(WasteItem.objects.filter(category=item.category).exclude(id=item.id).select_related('category')[:limit])
+
+    items = WasteItem.objects.select_related('category').in_bulk(ids[:limit])
+    return [items[pk] for pk in ids[:limit] if pk in items]
@@ -0,0 +1,150 @@
+"""
+Idempotent sync of reference data: categories, pickup stations and shipping rates.
+
+Each table is read once, diffed in memory against the desired rows, and only
+the differences are written (one bulk_create and one bulk_update at most). A
+deploy where nothing changed costs one SELECT per table.
+
+Rows are matched on a natural key. Fields listed in `managed` are kept in step
+with the desired values. Every other field is only set when the row is created,
+so admins can change station fees or addresses without the next deploy
+reverting them.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .conditional import bump_catalogue_version
+from .locations import KENYA_LOCATIONS
+from .models import Category, PickupStation, ShippingConfiguration
+
+CATEGORIES = [
+    {"name": "Electronics", "icon_class": "fa-laptop"},
+    {"name": "Plastics", "icon_class": "fa-bottle-water"},
+    {"name": "Metals", "icon_class": "fa-gears"},
+    {"name": "Paper", "icon_class": "fa-newspaper"},
+    {"name": "Glass", "icon_class": "fa-wine-bottle"},
+    {"name": "Organic", "icon_class": "fa-leaf"},
+    {"name": "Textiles", "icon_class": "fa-shirt"},
+]
+
+SHIPPING_RATES = {
+    "id": 1,
+    "same_county_fee": Decimal("200.00"),
+    "different_county_fee": Decimal("500.00"),
+    "standard_fee": Decimal("300.00"),
+}
+
+CURATED_STATIONS = [
+    # Nairobi
+    {"name": "G4S Westlands", "county": "Nairobi", "sub_county": "Westlands", "address": "Westlands Square, Ground Floor"},
+    {"name": "Wells Fargo CBD", "county": "Nairobi", "sub_county": "Starehe", "address": "City Centre, Moi Avenue"},
+    {"name": "Posta City Square", "county": "Nairobi", "sub_county": "Starehe", "address": "Haile Selassie Ave"},
+    {"name": "G4S Karen", "county": "Nairobi", "sub_county": "Langata", "address": "Karen Shopping Centre"},
+    {"name": "Wells Fargo Industrial Area", "county": "Nairobi", "sub_county": "Makadara", "address": "Enterprise Road"},
+    # Mombasa
+    {"name": "G4S Mombasa CBD", "county": "Mombasa", "sub_county": "Mvita", "address": "Nkrumah Road"},
+    {"name": "Wells Fargo Nyali", "county": "Mombasa", "sub_county": "Nyali", "address": "Nyali Centre"},
+    # Kisumu
+    {"name": "G4S Kisumu", "county": "Kisumu", "sub_county": "Kisumu Central", "address": "Oginga Odinga Street"},
+    # Nakuru
+    {"name": "G4S Nakuru", "county": "Nakuru", "sub_county": "Nakuru Town East", "address": "Kenyatta Avenue"},
+    # Kiambu
+    {"name": "G4S Thika", "county": "Kiambu", "sub_county": "Thika Town", "address": "Thika Arcade"},
+    {"name": "Wells Fargo Ruiru", "county": "Kiambu", "sub_county": "Ruiru", "address": "Ruiru Town"},
+    # Uasin Gishu
+    {"name": "G4S Eldoret", "county": "Uasin Gishu", "sub_county": "Turbo", "address": "Oloo Street"},
+]
+
+
+def category_rows():
+    return [dict(row, slug=slugify(row["name"])) for row in CATEGORIES]
+
+
+def sub_county_station_rows(shipping_fee=Decimal("250.00")):
+    """One station per county/sub-county pair, e.g. "Nakuru - Molo Station"."""
+    return [
+        {
+            "name": f"{county} - {sub_county} Station",
+            "county": county,
+            "sub_county": sub_county,
+            "address": f"{sub_county} Center, {county}",
+            "shipping_fee": shipping_fee,
+        }
+        for county, sub_counties in KENYA_LOCATIONS.items()
+        for sub_county in sub_counties
+    ]
+
+
+def curated_station_rows():
+    """Named courier depots plus a town pickup point for every county."""
+    rows = list(CURATED_STATIONS)
+    for county, sub_counties in KENYA_LOCATIONS.items():
+        if sub_counties:
+            rows.append({
+                "name": f"{county} Town Pickup Point",
+                "county": county,
+                "sub_county": sub_counties[0],
+                "address": f"Main Bus Stage, {sub_counties[0]}",
+            })
+    return rows
+
+
+def sync(model, rows, key, managed=()):
+    """
+    Make `model` contain `rows` (dicts of field values), matched on the `key`
+    fields. Missing rows are created; `managed` fields of existing rows are
+    updated when they differ. Returns (created, updated).
+    """
+    fields = set(key) | set(managed)
+    existing = {
+        tuple(getattr(obj, name) for name in key): obj
+        for obj in model.objects.only("pk", *fields)
+    }
+
+    to_create, to_update = [], []
+    for row in rows:
+        row_key = tuple(row[name] for name in key)
+        obj = existing.get(row_key)
+        if obj is None:
+            obj = existing[row_key] = model(**row)
+            to_create.append(obj)
+            continue
+        if obj._state.adding:
+            # Repeated key in `rows`; the first occurrence wins
+            continue
+        changed = False
+        for name in managed:
+            if getattr(obj, name) != row[name]:
+                setattr(obj, name, row[name])
+                changed = True
+        if changed:
+            to_update.append(obj)
+
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        model.objects.bulk_update(to_update, list(managed), batch_size=500)
+    return len(to_create), len(to_update)
+
+
+@transaction.atomic
+def sync_reference_data(stations=True, curated_stations=False):
+    """Sync categories, shipping rates and pickup stations; returns {table: (created, updated)}."""
+    result = {
+        "shipping": sync(ShippingConfiguration, [SHIPPING_RATES], key=("id",),
+                         managed=("same_county_fee", "different_county_fee", "standard_fee")),
+        "categories": sync(Category, category_rows(), key=("name",)),
+    }
+    if any(result["categories"]):
+        # bulk writes skip the Category signals
+        transaction.on_commit(bump_catalogue_version)
+    station_rows = []
+    if stations:
+        station_rows += sub_county_station_rows()
+    if curated_stations:
+        station_rows += curated_station_rows()
+    if station_rows:
+        result["stations"] = sync(PickupStation, station_rows, key=("name",))
+    return result
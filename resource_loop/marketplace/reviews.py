@@ -0,0 +1,106 @@
+"""
+Review aggregation.
+
+WasteItem.rating, reviews_count and rating_total are running aggregates updated
+atomically in SQL whenever a review is written, so listing pages and rating
+sorts/filters read plain columns. `reconcile_ratings()` repairs any drift nightly.
+Listings that were rated before Review existed keep those ratings as a
+baseline (legacy_rating_total, legacy_reviews_count) under their reviews.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from .conditional import bump_catalogue_version
+from .models import Review, WasteItem
+
+
+def _average(total, count):
+    """
+    SQL for the rating of `total` over `count` reviews. Both submit_review() and
+    reconcile_ratings() use it, so they always round the same way.
+    """
+    return Round(Cast(total, FloatField()) / count, 1)
+
+
+def _apply(item_id, total_delta, count_delta):
+    # Every F() on the right-hand side reads the pre-update row, so this is one atomic UPDATE.
+    new_total = F('rating_total') + total_delta
+    new_count = F('reviews_count') + count_delta
+    WasteItem.objects.filter(pk=item_id).update(
+        rating_total=new_total,
+        reviews_count=new_count,
+        rating=Case(
+            When(reviews_count__gt=-count_delta, then=_average(new_total, new_count)),
+            default=Value(0.0),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def submit_review(item, user, rating, comment=''):
+    """Create or update `user`'s review of `item` and fold it into the item's aggregates."""
+    with transaction.atomic():
+        review = Review.objects.select_for_update().filter(item=item, user=user).first()
+        if review:
+            total_delta, count_delta = rating - review.rating, 0
+            review.rating = rating
+            review.comment = comment
+            review.save(update_fields=['rating', 'comment', 'updated_at'])
+        else:
+            total_delta, count_delta = rating, 1
+            review = Review.objects.create(item=item, user=user, rating=rating, comment=comment)
+        _apply(item.pk, total_delta, count_delta)
+        transaction.on_commit(bump_catalogue_version)
+    return review
+
+
+def delete_review(review):
+    with transaction.atomic():
+        review.delete()
+        _apply(review.item_id, -review.rating, -1)
+        transaction.on_commit(bump_catalogue_version)
+
+
+def reconcile_ratings(batch_size=1000):
+    """
+    Recompute every item's aggregates from its legacy baseline plus Review and
+    fix the ones that drifted; other rows (and their updated_at) are left alone.
+    Ratings are recomputed in SQL with _average(), exactly as reviews write them.
+    """
+    stats = {
+        row['item_id']: (row['total'], row['n'])
+        for row in Review.objects.values('item_id').annotate(total=Sum('rating'), n=Count('id'))
+    }
+    stored_average = Case(
+        When(reviews_count__gt=0, then=_average(F('rating_total'), F('reviews_count'))),
+        default=Value(0.0),
+    )
+
+    now = timezone.now()
+    fixed = []
+    rows = WasteItem.objects.only(
+        'id', 'rating', 'reviews_count', 'rating_total', 'legacy_rating_total', 'legacy_reviews_count',
+    ).annotate(stored_average=stored_average).iterator(chunk_size=batch_size)
+    for item in rows:
+        total, count = stats.get(item.pk, (0, 0))
+        total += item.legacy_rating_total
+        count += item.legacy_reviews_count
+        if (item.rating_total, item.reviews_count) == (total, count):
+            if item.pk not in stats:
+                continue  # legacy-only rating, kept as it was entered
+            if float(item.rating) == item.stored_average:
+                continue
+        item.rating_total, item.reviews_count = total, count
+        item.updated_at = now
+        fixed.append(item)
+
+    with transaction.atomic():
+        WasteItem.objects.bulk_update(fixed, ['rating_total', 'reviews_count', 'updated_at'], batch_size=batch_size)
+        for start in range(0, len(fixed), batch_size):
+            ids = [item.pk for item in fixed[start:start + batch_size]]
+            WasteItem.objects.filter(pk__in=ids).update(rating=stored_average)
+    if fixed:
+        bump_catalogue_version()
+    return len(fixed)
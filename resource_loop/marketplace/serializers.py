@@ -1,29 +1,123 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import WasteItem, Category, Notification
+from .models import WasteItem, Category, Notification, ListingImportJob
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
 
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that accepts an optional `fields` argument
+    restricting the output to the named fields (sparse fieldsets).
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
-class WasteItemSerializer(serializers.ModelSerializer):
+class WasteItemSerializer(DynamicFieldsModelSerializer):
     category = CategorySerializer(read_only=True)
     seller_name = serializers.CharField(source='seller.business_name', read_only=True)
 
     class Meta:
         model = WasteItem
-        fields = '__all__'
+        exclude = ['legacy_rating_total', 'legacy_reviews_count']
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
 
+class ListingImportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ListingImportJob
+        fields = ['id', 'file', 'status', 'progress', 'total_rows', 'processed_rows', 'created_count',
+                  'error_count', 'errors', 'message', 'created_at', 'finished_at']
+        read_only_fields = [f for f in fields if f != 'file']
+
 class OTPSerializer(serializers.Serializer):
     otp = serializers.CharField(max_length=6, min_length=6)
+
+class WasteItemListSerializer:
+    """
+    Read-only fast path producing the same payload as WasteItemSerializer.
+
+    Works on `.values()` rows rather than model instances: nested categories are
+    serialized once per response and image URLs once per distinct file, so list
+    endpoints skip model instantiation and per-row nested serializers.
+    """
+    # Output fields backed by a different column (or join) than their name.
+    column_map = {
+        'category': 'category_id',
+        'seller': 'seller_id',
+        'seller_name': 'seller__business_name',
+    }
+    # Always selected so cursor pagination can read its position from the row.
+    extra_columns = ('id', 'created_at')
+
+    def __init__(self, fields=None, context=None):
+        self.context = context or {}
+        self.fields = WasteItemSerializer(fields=fields, context=self.context).fields
+        self._image_urls = {}
+
+    @property
+    def columns(self):
+        columns = [self.column_map.get(name, name) for name in self.fields]
+        return columns + [c for c in self.extra_columns if c not in columns]
+
+    def serialize(self, rows):
+        rows = list(rows)
+        plan = [
+            (name, self.column_map.get(name, name), self._get_converter(name, field, rows))
+            for name, field in self.fields.items()
+        ]
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in plan:
+                value = row[column]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+    def _get_converter(self, name, field, rows):
+        if name == 'category':
+            return self._category_payloads(rows).get
+        if isinstance(field, serializers.ImageField):
+            return self._image_url
+        if isinstance(field, (serializers.DateTimeField, serializers.DecimalField)):
+            return field.to_representation
+        # Char, choice, boolean and numeric columns come back from the
+        # database already in their JSON representation.
+        return None
+
+    def _category_payloads(self, rows):
+        ids = {row['category_id'] for row in rows if row['category_id'] is not None}
+        categories = Category.objects.filter(id__in=ids)
+        return {c['id']: dict(c) for c in CategorySerializer(categories, many=True).data}
+
+    def _image_url(self, name):
+        if name not in self._image_urls:
+            url = None
+            if name:
+                url = WasteItem._meta.get_field('image').storage.url(name)
+                request = self.context.get('request')
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+            self._image_urls[name] = url
+        return self._image_urls[name]
@@ -1,14 +1,23 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
-from .models import Order, Notification, ActivityLog
+from django.contrib.auth.models import User
+from .models import Order, Notification, WasteItem, BuyerProfile, SellerProfile, Category
+from .activity import log_activity
+from .identity import normalize_phone, normalize_text, set_identifiers
+from .facets import FACET_FIELDS, SEARCH_FIELDS, item_facets
 from django.urls import reverse
-from .tasks import send_email_task
+from django.db import transaction
+from .mail_queue import queue_email
+from .tasks import listing_changed_task, process_image_task, refresh_related_items_task
+from .images import needs_processing
+from .storefront import invalidate_storefront
+from .conditional import bump_catalogue_version
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
     ip = request.META.get('REMOTE_ADDR')
-    ActivityLog.objects.create(
+    log_activity(
         user=user,
         action='login',
         description=f"User {user.username} logged in.",
@@ -19,7 +28,7 @@ def log_user_login(sender, request, user, **kwargs):
 def log_user_logout(sender, request, user, **kwargs):
     ip = request.META.get('REMOTE_ADDR')
     if user:
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action='logout',
             description=f"User {user.username} logged out.",
@@ -65,7 +74,7 @@ def notify_order_status_change(sender, instance, created, **kwargs):
             if instance.pickup_station:
                 pickup_info = f"\n\nPickup Station: {instance.pickup_station.name}\nAddress: {instance.pickup_station.address}\n\nPlease pick up your item within 7 working days."
             
-            send_email_task.delay(
+            queue_email(
                 subject="Order Delivered - Resource Loop",
                 message=f"Hello {instance.user.username},\n\nYour order #{instance.order_uuid} has been delivered successfully.{pickup_info}\n\nThank you for shopping with us!",
                 recipient_list=[instance.user.email]
@@ -82,7 +91,7 @@ def notify_order_status_change(sender, instance, created, **kwargs):
             link=reverse('order_detail', args=[instance.id])
         )
         try:
-            send_email_task.delay(
+            queue_email(
                 subject="Order Shipped - Resource Loop",
                 message=f"Hello {instance.user.username},\n\nYour order #{instance.order_uuid} has been shipped and is on its way.\n\nTrack your order in the dashboard.",
                 recipient_list=[instance.user.email]
@@ -99,10 +108,111 @@ def notify_order_status_change(sender, instance, created, **kwargs):
             link=reverse('order_detail', args=[instance.id])
         )
         try:
-            send_email_task.delay(
+            queue_email(
                 subject="Order Cancelled - Resource Loop",
                 message=f"Hello {instance.user.username},\n\nYour order #{instance.order_uuid} has been cancelled.\n\nIf you did not request this, please contact support.",
                 recipient_list=[instance.user.email]
             )
         except Exception as e:
             print(f"Failed to send cancelled email: {e}")
+
+
+RELATED_ITEM_FIELDS = ('title', 'specifications', 'category_id', 'county', 'price')
+# Columns the post_save handlers below compare against the stored listing
+OLD_ITEM_FIELDS = sorted({f.removesuffix('_id') for f in FACET_FIELDS + SEARCH_FIELDS + RELATED_ITEM_FIELDS} | {'seller'})
+
+def _untouched(update_fields, fields):
+    """True when a save(update_fields=...) cannot have changed any of `fields`."""
+    if update_fields is None:
+        return False
+    return not {f.removesuffix('_id') for f in update_fields} & {f.removesuffix('_id') for f in fields}
+
+@receiver(pre_save, sender=WasteItem)
+def capture_old_item(sender, instance, update_fields=None, **kwargs):
+    """
+    Capture the stored values of a listing before saving, so post_save
+    handlers can update derived data for exactly what changed.
+    """
+    instance._old_item = None
+    if instance.pk and not _untouched(update_fields, OLD_ITEM_FIELDS):
+        instance._old_item = WasteItem.objects.filter(pk=instance.pk).only(*OLD_ITEM_FIELDS).first()
+
+def _queue_listing_change(seller_ids, old_facets=None, new_facets=None, text_changed=False):
+    # Facet counts and storefront caches are updated after commit by a task,
+    # so saving a listing is just its own write
+    seller_ids = sorted(seller_ids)
+    transaction.on_commit(lambda: listing_changed_task.delay(seller_ids, old_facets, new_facets, text_changed))
+
+@receiver(post_save, sender=WasteItem)
+def queue_listing_change_on_save(sender, instance, created, update_fields=None, **kwargs):
+    old_item = getattr(instance, '_old_item', None)
+    seller_ids = {instance.seller_id}
+    if old_item and old_item.seller_id != instance.seller_id:
+        seller_ids.add(old_item.seller_id)
+    old_facets = new_facets = None
+    if not _untouched(update_fields, FACET_FIELDS):
+        old_facets, new_facets = item_facets(old_item) if old_item else {}, item_facets(instance)
+    text_changed = not _untouched(update_fields, SEARCH_FIELDS) and (
+        old_item is None or any(getattr(old_item, f) != getattr(instance, f) for f in SEARCH_FIELDS)
+    )
+    _queue_listing_change(seller_ids, old_facets, new_facets, text_changed)
+
+@receiver(post_save, sender=WasteItem)
+def refresh_related_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Re-index related listings when a listing's content changes (not on stock updates).
+    """
+    if _untouched(update_fields, RELATED_ITEM_FIELDS):
+        return
+    old_item = getattr(instance, '_old_item', None)
+    if old_item and all(getattr(old_item, f) == getattr(instance, f) for f in RELATED_ITEM_FIELDS):
+        return
+    item_id = instance.id
+    transaction.on_commit(lambda: refresh_related_items_task.delay(item_id))
+
+@receiver(post_delete, sender=WasteItem)
+def queue_listing_change_on_delete(sender, instance, **kwargs):
+    _queue_listing_change({instance.seller_id}, item_facets(instance), {})
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalogue_on_category_change(sender, instance, **kwargs):
+    # Search and list pages render the category list
+    transaction.on_commit(bump_catalogue_version)
+
+@receiver(post_save, sender=SellerProfile)
+def invalidate_storefront_on_profile_change(sender, instance, **kwargs):
+    # Cached listing cards carry the seller's name and verification badge
+    invalidate_storefront(instance.pk)
+
+
+@receiver(post_save, sender=WasteItem)
+def queue_item_image_variants(sender, instance, **kwargs):
+    if needs_processing(instance.image, instance.image_variants):
+        pk = instance.pk
+        transaction.on_commit(lambda: process_image_task.delay('marketplace.wasteitem', pk))
+
+@receiver(post_save, sender=SellerProfile)
+def queue_profile_image_variants(sender, instance, **kwargs):
+    if needs_processing(instance.profile_image, instance.profile_image_variants):
+        pk = instance.pk
+        transaction.on_commit(lambda: process_image_task.delay('marketplace.sellerprofile', pk))
+
+
+@receiver(post_save, sender=User)
+def sync_user_identifiers(sender, instance, update_fields=None, **kwargs):
+    """Mirror email/username into UserIdentifier (skipped for e.g. last_login updates)."""
+    if update_fields is not None and not {'email', 'username'} & set(update_fields):
+        return
+    set_identifiers(instance.pk, 'email', normalize_text(instance.email))
+    set_identifiers(instance.pk, 'username', normalize_text(instance.username))
+
+
+@receiver(post_save, sender=BuyerProfile)
+def sync_phone_identifier(sender, instance, **kwargs):
+    set_identifiers(instance.user_id, 'phone', normalize_phone(instance.phone_number))
+
+
+@receiver(post_delete, sender=BuyerProfile)
+def remove_phone_identifier(sender, instance, **kwargs):
+    set_identifiers(instance.user_id, 'phone', '')
@@ -0,0 +1,53 @@
+"""
+Listing slugs: the slugified title plus a short random suffix, e.g.
+"copper-wire-offcuts-k3v9qz".
+
+With SUFFIX_LENGTH base-36 characters there are ~2 billion suffixes per title,
+so a single listing takes a slug without checking the table first: creating a
+listing is one INSERT, and two identical titles (from one seller or several)
+no longer collide. Batch inserts reserve all their slugs with allocate_slugs(),
+which checks the whole batch in one query and redraws the rare clash.
+"""
+import secrets
+import string
+
+from django.utils.text import slugify
+
+SLUG_MAX_LENGTH = 50  # WasteItem.slug is a default SlugField
+SUFFIX_LENGTH = 6
+SUFFIX_ALPHABET = string.ascii_lowercase + string.digits
+
+
+def _suffix():
+    return ''.join(secrets.choice(SUFFIX_ALPHABET) for _ in range(SUFFIX_LENGTH))
+
+
+def base_slug(title):
+    """The title part, short enough to leave room for '-<suffix>'."""
+    return slugify(title)[:SLUG_MAX_LENGTH - SUFFIX_LENGTH - 1].strip('-')
+
+
+def new_slug(title):
+    """A fresh slug for `title`, without any database query."""
+    base = base_slug(title)
+    return f'{base}-{_suffix()}' if base else _suffix()
+
+
+def allocate_slugs(titles):
+    """Free slugs for `titles` (in order), checked against WasteItem in one query per round."""
+    from .models import WasteItem
+
+    slugs = [None] * len(titles)
+    accepted = set()
+    pending = range(len(titles))
+    while pending:
+        candidates = {i: new_slug(titles[i]) for i in pending}
+        taken = set(WasteItem.objects.filter(slug__in=candidates.values()).values_list('slug', flat=True))
+        pending = []
+        for i, slug in candidates.items():
+            if slug in taken or slug in accepted:
+                pending.append(i)
+            else:
+                accepted.add(slug)
+                slugs[i] = slug
+    return slugs
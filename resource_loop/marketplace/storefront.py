@@ -0,0 +1,49 @@
+"""
+Cached, keyset-paginated seller storefronts (seller_profile_public).
+
+Each page of a seller's in-stock listings is cached under that seller's version
+number. Any save or delete of one of the seller's listings (via
+listing_changed_task, after commit), or of the seller profile itself, bumps the
+version (see signals.py), so a popular seller's pages are served from the cache
+until their inventory actually changes. Other sellers' caches are untouched.
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import WasteItem
+from .pagination import KeysetPaginator
+
+PAGE_SIZE = 24
+CACHE_TIMEOUT = 900
+
+
+def _version_key(seller_id):
+    return f'storefront:{seller_id}:version'
+
+
+def invalidate_storefront(seller_id):
+    # A lost version is reseeded from the clock, never back to a value whose
+    # pages may still be cached
+    try:
+        cache.incr(_version_key(seller_id))
+    except ValueError:
+        cache.set(_version_key(seller_id), time.time_ns(), None)
+
+
+def storefront_page(seller, after=None, before=None):
+    """One KeysetPage of `seller`'s in-stock listings, from the cache when possible."""
+    # Unreadable cursors mean the first page; don't let them mint cache keys
+    after = after if after and KeysetPaginator.decode_cursor(after) else None
+    before = before if before and KeysetPaginator.decode_cursor(before) else None
+    version = cache.get_or_set(_version_key(seller.pk), time.time_ns, None)
+    key = f'storefront:{seller.pk}:{version}:{after or ""}:{before or ""}'
+    page = cache.get(key)
+    if page is None:
+        items = WasteItem.objects.filter(seller=seller, stock_quantity__gt=0).select_related('category')
+        page = KeysetPaginator(items, PAGE_SIZE).page(after=after, before=before)
+        for item in page:
+            # Every card belongs to this seller; saves a lookup per card
+            item.seller = seller
+        cache.set(key, page, CACHE_TIMEOUT)
+    return page
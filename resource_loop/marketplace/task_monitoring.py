@@ -0,0 +1,143 @@
+"""
+Celery task instrumentation.
+
+Signal handlers stamp every published task with an `enqueued_at` header and,
+wherever the task runs, record queue wait (enqueue to start), run time,
+retries and failures. Each event is one JSON line on the
+`marketplace.task_events` logger, which is how worker-side numbers reach
+operators. They also go into that process's metrics registry, which /metrics
+serves when tasks run in the web process (CELERY_TASK_ALWAYS_EAGER). Payment
+callbacks carry their CheckoutRequestID so a payment can be followed end to end.
+
+At scrape time /metrics also reports the length and oldest-message age of the
+Redis queues in CELERY_MONITORED_QUEUES, which shows a growing backlog even
+while the workers are too busy to report anything themselves.
+"""
+import json
+import logging
+import threading
+import time
+
+from celery.signals import before_task_publish, task_failure, task_postrun, task_prerun, task_retry
+from django.conf import settings
+
+from .metrics import registry
+
+logger = logging.getLogger('marketplace.task_events')
+
+registry.describe('celery_task_runs_total', 'counter', 'Finished task runs by task and final state.')
+registry.describe('celery_task_duration_seconds', 'histogram', 'Task run time.')
+registry.describe('celery_task_queue_wait_seconds', 'histogram', 'Time from publishing a task to a worker starting it.')
+registry.describe('celery_task_retries_total', 'counter', 'Task retries by task.')
+registry.describe('celery_task_failures_total', 'counter', 'Task failures by task and exception type.')
+registry.describe('celery_queue_length', 'gauge', 'Messages waiting in a broker queue.')
+registry.describe('celery_queue_oldest_age_seconds', 'gauge', 'Age of the oldest message waiting in a broker queue.')
+
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+_started = {}
+_started_lock = threading.Lock()
+
+
+def checkout_request_id(args, kwargs):
+    callback_data = args[0] if args else kwargs.get('callback_data') or {}
+    try:
+        return callback_data['Body']['stkCallback']['CheckoutRequestID']
+    except (KeyError, TypeError):
+        return None
+
+
+# Extra identifiers to put on a task's log lines, by task name
+LOG_KEYS = {
+    'marketplace.tasks.process_mpesa_callback_task': ('checkout_request_id', checkout_request_id),
+}
+
+
+def _log(level, event, task_name, task_id, args=None, kwargs=None, **fields):
+    record = {'event': event, 'task': task_name, 'task_id': task_id}
+    key = LOG_KEYS.get(task_name)
+    if key is not None:
+        name, extract = key
+        record[name] = extract(args or (), kwargs or {})
+    record.update(fields)
+    logger.log(level, json.dumps(record, default=str))
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+@task_prerun.connect
+def record_task_start(sender=None, task_id=None, task=None, args=None, kwargs=None, **extra):
+    now = time.time()
+    with _started_lock:
+        _started[task_id] = now
+
+    enqueued_at = getattr(task.request, 'enqueued_at', None) or (task.request.headers or {}).get('enqueued_at')
+    fields = {}
+    if enqueued_at:
+        wait = max(0.0, now - float(enqueued_at))
+        registry.observe('celery_task_queue_wait_seconds', wait, buckets=WAIT_BUCKETS, task=task.name)
+        fields['wait_ms'] = round(wait * 1000, 2)
+    _log(logging.INFO, 'task_started', task.name, task_id, args, kwargs, retries=task.request.retries, **fields)
+
+
+@task_postrun.connect
+def record_task_finish(sender=None, task_id=None, task=None, args=None, kwargs=None, state=None, **extra):
+    with _started_lock:
+        started = _started.pop(task_id, None)
+    duration = time.time() - started if started else 0.0
+
+    registry.inc('celery_task_runs_total', task=task.name, state=state or 'UNKNOWN')
+    registry.observe('celery_task_duration_seconds', duration, task=task.name)
+    level = logging.INFO if state == 'SUCCESS' else logging.WARNING
+    _log(level, 'task_finished', task.name, task_id, args, kwargs, state=state, duration_ms=round(duration * 1000, 2))
+
+
+@task_retry.connect
+def record_task_retry(sender=None, request=None, reason=None, **extra):
+    registry.inc('celery_task_retries_total', task=sender.name)
+    _log(logging.WARNING, 'task_retry', sender.name, request.id, request.args, request.kwargs, reason=str(reason))
+
+
+@task_failure.connect
+def record_task_failure(sender=None, task_id=None, exception=None, args=None, kwargs=None, **extra):
+    registry.inc('celery_task_failures_total', task=sender.name, exception=type(exception).__name__)
+    _log(logging.ERROR, 'task_failed', sender.name, task_id, args, kwargs, error=repr(exception))
+
+
+def queue_gauges():
+    """Backlog gauges read straight from the Redis broker (nothing when tasks run eagerly)."""
+    broker = settings.CELERY_BROKER_URL
+    if settings.CELERY_TASK_ALWAYS_EAGER or not broker.startswith(('redis://', 'rediss://')):
+        return
+
+    import redis
+    from kombu.transport.redis import PRIORITY_STEPS, Channel
+    client = redis.Redis.from_url(broker, socket_timeout=1, socket_connect_timeout=1)
+    now = time.time()
+    for queue in settings.CELERY_MONITORED_QUEUES:
+        # Messages sent with a priority sit in side lists named "<queue>\x06\x16<priority>"
+        lists = [queue] + [f'{queue}{Channel.sep}{step}' for step in PRIORITY_STEPS if step]
+        pipe = client.pipeline()
+        for name in lists:
+            # Kombu LPUSHes new messages and BRPOPs from the right: the oldest is last
+            pipe.llen(name)
+            pipe.lindex(name, -1)
+        results = pipe.execute()
+        yield 'celery_queue_length', {'queue': queue}, sum(results[0::2])
+
+        age = 0.0
+        for oldest in results[1::2]:
+            try:
+                enqueued_at = json.loads(oldest)['headers'].get('enqueued_at')
+            except (TypeError, ValueError, KeyError):
+                enqueued_at = None
+            if enqueued_at:
+                age = max(age, now - float(enqueued_at))
+        yield 'celery_queue_oldest_age_seconds', {'queue': queue}, age
+
+
+registry.add_collector(queue_gauges)
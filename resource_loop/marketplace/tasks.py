@@ -1,22 +1,33 @@
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import OperationalError, transaction
 from .models import Notification, User, Transaction, Order, BuyerProfile, Cart
 import json
+import logging
 
-@shared_task
-def process_mpesa_callback_task(callback_data):
+logger = logging.getLogger(__name__)
+
+# Outcomes (timings, retries, failures) are recorded by marketplace.task_monitoring;
+# tasks log what they did and raise on errors instead of returning error strings.
+
+@shared_task(bind=True, autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5,
+             acks_late=True, reject_on_worker_lost=True)
+def process_mpesa_callback_task(self, callback_data):
     """
     Background task to process M-Pesa callback logic.
+    Acknowledged only after it finishes (a crashed worker's callback is redelivered)
+    and retried with backoff when the database is unavailable; both are safe because
+    only pending transactions are updated.
     """
-    print("🔄 [Celery] Processing M-Pesa Callback...")
+    body = callback_data.get('Body', {})
+    stk_cb = body.get('stkCallback', {})
+    checkout_request_id = stk_cb.get('CheckoutRequestID')
+    logger.info("[%s] Processing M-Pesa callback", checkout_request_id)
     
     try:
         # Extract details
-        body = callback_data.get('Body', {})
-        stk_cb = body.get('stkCallback', {})
         result_code = stk_cb.get('ResultCode')
-        checkout_request_id = stk_cb.get('CheckoutRequestID')
         metadata = stk_cb.get('CallbackMetadata', {})
         items = metadata.get('Item', []) if isinstance(metadata, dict) else []
 
@@ -40,83 +51,93 @@ def process_mpesa_callback_task(callback_data):
         # Find user
         user = None
         if phone:
-            try:
-                bp = BuyerProfile.objects.get(phone_number=phone)
-                user = bp.user
-            except BuyerProfile.DoesNotExist:
-                user = None
+            bp = BuyerProfile.objects.filter(phone_number=phone).select_related('user').first()
+            user = bp.user if bp else None
 
         # Update Transaction
         if checkout_request_id:
-            tx = Transaction.objects.filter(checkout_request_id=checkout_request_id).first()
+            with transaction.atomic():
+                # Lock the row: a redelivered or duplicate callback waits here, then
+                # finds the transaction no longer pending and leaves it alone
+                tx = Transaction.objects.select_for_update().filter(checkout_request_id=checkout_request_id).first()
 
-            if tx:
-                if result_code == 0:
-                    tx.state = 'confirmed'
+                if tx and tx.state != 'pending':
+                    logger.info("[%s] Transaction already %s, skipping duplicate callback", checkout_request_id, tx.state)
+                    return "Callback already processed"
+
+                if tx:
+                    if result_code == 0:
+                        tx.state = 'confirmed'
                     
-                    # Determine the best available name
-                    final_name = mpesa_name
-                    if not final_name and user:
-                        final_name = user.get_full_name() or user.username
+                        # Determine the best available name
+                        final_name = mpesa_name
+                        if not final_name and user:
+                            final_name = user.get_full_name() or user.username
                     
-                    # Only update if we found a valid name, otherwise keep the one from creation
-                    if final_name:
-                        tx.mpesa_name = final_name
+                        # Only update if we found a valid name, otherwise keep the one from creation
+                        if final_name:
+                            tx.mpesa_name = final_name
                         
-                    tx.phone_number = phone or tx.phone_number
-                    tx.mpesa_receipt_number = mpesa_receipt_number
-                    tx.save()
+                        tx.phone_number = phone or tx.phone_number
+                        tx.mpesa_receipt_number = mpesa_receipt_number
+                        tx.save()
                     
-                    # Update Order
-                    if tx.order:
-                        tx.order.status = 'confirmed'
-                        tx.order.save()
+                        # Update Order
+                        if tx.order:
+                            tx.order.status = 'confirmed'
+                            tx.order.save()
                         
-                        # Reduce stock
-                        for order_item in tx.order.items.all():
-                            if order_item.item:
-                                try:
-                                    current_stock = int(order_item.item.stock_quantity)
-                                    new_stock = max(0, current_stock - order_item.quantity)
-                                    order_item.item.stock_quantity = str(new_stock)
-                                    order_item.item.save()
-                                except ValueError:
-                                    pass
+                            # Reduce stock
+                            for order_item in tx.order.items.all():
+                                if order_item.item:
+                                    try:
+                                        current_stock = int(order_item.item.stock_quantity)
+                                        new_stock = max(0, current_stock - order_item.quantity)
+                                        order_item.item.stock_quantity = str(new_stock)
+                                        order_item.item.save()
+                                    except ValueError:
+                                        pass
                         
-                        # Trigger Notifications (Import locally to avoid circular dependency if needed)
-                        from .views import send_seller_notifications, send_buyer_order_confirmation
-                        send_seller_notifications(tx.order)
-                        send_buyer_order_confirmation(tx.order)
-
-                    # Clear Cart
-                    try:
-                        # Use the user from the order, which is more reliable than phone lookup
-                        cart_user = tx.order.user if tx.order else user
-                        if cart_user:
-                            cart = Cart.objects.get(user=cart_user)
-                            cart.items.all().delete()
-                            print(f"✅ [Celery] Cart cleared for user {cart_user.username}")
-                    except Cart.DoesNotExist:
-                        pass
+                            # Trigger Notifications once the confirmation is committed (Import locally to avoid circular dependency)
+                            from .views import send_seller_notifications, send_buyer_order_confirmation
+                            order = tx.order
+                            transaction.on_commit(lambda: send_seller_notifications(order))
+                            transaction.on_commit(lambda: send_buyer_order_confirmation(order))
+
+                        # Clear Cart
+                        try:
+                            # Use the user from the order, which is more reliable than phone lookup
+                            cart_user = tx.order.user if tx.order else user
+                            if cart_user:
+                                cart = Cart.objects.get(user=cart_user)
+                                cart.items.all().delete()
+                                logger.info("[%s] Cart cleared for user %s", checkout_request_id, cart_user.username)
+                        except Cart.DoesNotExist:
+                            pass
+                    else:
+                        tx.state = 'cancelled'
+                        tx.mpesa_name = mpesa_name or (user.get_full_name() if user else '')
+                        tx.phone_number = phone or tx.phone_number
+                        tx.save()
+                        if tx.order:
+                            tx.order.status = 'cancelled'
+                            tx.order.save()
                 else:
-                    tx.state = 'cancelled'
-                    tx.mpesa_name = mpesa_name or (user.get_full_name() if user else '')
-                    tx.phone_number = phone or tx.phone_number
-                    tx.save()
-                    if tx.order:
-                        tx.order.status = 'cancelled'
-                        tx.order.save()
-        
+                    logger.warning("[%s] No transaction found for callback", checkout_request_id)
+
+        logger.info("[%s] Callback processed (ResultCode %s)", checkout_request_id, result_code)
         return "Callback processed successfully"
 
-    except Exception as e:
-        print(f"❌ [Celery] Callback Processing Failed: {e}")
-        return f"Error: {e}"
+    except Exception:
+        logger.exception("[%s] Callback processing failed", checkout_request_id)
+        raise
 
-@shared_task
-def send_email_task(subject, message, recipient_list, html_message=None):
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_email_task(self, subject, message, recipient_list, html_message=None, transient=False):
     """
     Background task to send an email.
+    Retried a few times; after that the message is saved for `retry_emails`
+    (unless it is transient, e.g. a one-time code).
     """
     try:
         send_mail(
@@ -129,8 +150,57 @@ def send_email_task(subject, message, recipient_list, html_message=None):
         )
         return f"Email sent to {recipient_list}"
     except Exception as e:
-        print(f"❌ EMAIL TASK FAILED: {e}")
-        return f"Failed to send email: {e}"
+        if self.request.retries < self.max_retries and not self.request.is_eager:
+            raise self.retry(exc=e)
+        logger.error("Email %r to %s failed, saving for retry: %s", subject, recipient_list, e)
+        from .mail_queue import persist
+        persist(subject, message, recipient_list, html_message, transient=transient, error=e)
+        raise
+
+@shared_task
+def flush_activity_log_task():
+    """
+    Periodic task to write buffered activity events to the database.
+    """
+    from .activity import flush_activity_log
+    written = flush_activity_log()
+    return f"Flushed {written} activity events"
+
+@shared_task
+def prune_activity_log_task():
+    """
+    Daily task to archive and delete activity logs past their retention period.
+    """
+    from .activity import prune_activity_log
+    removed = prune_activity_log()
+    return f"Rolled over {removed} activity log rows"
+
+@shared_task
+def purge_otps_task():
+    """
+    Daily task to delete OTP audit rows past their retention period.
+    """
+    from .otp_store import purge_otps
+    deleted = purge_otps()
+    return f"Purged {deleted} OTP records"
+
+@shared_task
+def purge_upload_sessions_task():
+    """
+    Daily task to delete abandoned photo uploads and their files.
+    """
+    from .uploads import purge_upload_sessions
+    purged = purge_upload_sessions()
+    return f"Purged {purged} upload sessions"
+
+@shared_task
+def retry_pending_emails_task():
+    """
+    Periodic task to retry emails saved after a failed or interrupted delivery.
+    """
+    from .mail_queue import retry_pending_emails
+    sent, failed = retry_pending_emails()
+    return f"Retried pending emails: {sent} sent, {failed} failed"
 
 @shared_task
 def create_notification_task(user_id, title, message, link=None):
@@ -142,4 +212,113 @@ def create_notification_task(user_id, title, message, link=None):
         Notification.objects.create(user=user, title=title, message=message, link=link)
         return f"Notification created for {user.username}"
     except User.DoesNotExist:
+        logger.warning("Notification %r skipped: user %s no longer exists", title, user_id)
         return "User not found"
+
+
+@shared_task
+def rebuild_recommendations_task():
+    """
+    Periodic task to recompute item neighbours and user recommendations.
+    """
+    from .recommendations import rebuild_recommendations
+    neighbours, candidates = rebuild_recommendations()
+    return f"Rebuilt {neighbours} item neighbours and {candidates} user recommendations"
+
+
+@shared_task
+def reconcile_ratings_task():
+    """
+    Nightly task to repair drift in the denormalized item rating aggregates.
+    """
+    from .reviews import reconcile_ratings
+    fixed = reconcile_ratings()
+    return f"Reconciled ratings for {fixed} items"
+
+@shared_task
+def refresh_related_items_task(item_id):
+    """
+    Background task to recompute the related listings of one item.
+    """
+    from .models import WasteItem
+    from .recommendations import refresh_related_items
+    item = WasteItem.objects.filter(id=item_id).first()
+    if not item:
+        return "Item not found"
+    refresh_related_items(item)
+    return f"Related items refreshed for item {item_id}"
+
+@shared_task
+def refresh_related_batch_task(item_ids):
+    """
+    Background task to recompute the related listings of many items at once,
+    e.g. after a bulk import.
+    """
+    from .models import WasteItem
+    from .recommendations import refresh_related_items
+    count = 0
+    for start in range(0, len(item_ids), 500):
+        for item in WasteItem.objects.filter(id__in=item_ids[start:start + 500]):
+            refresh_related_items(item)
+            count += 1
+    return f"Related items refreshed for {count} items"
+
+@shared_task
+def listing_changed_task(seller_ids, old_facets=None, new_facets=None, text_changed=False):
+    """
+    Background task to update the catalogue version, facet counts and seller
+    storefront caches after a listing is saved or deleted. Facets are only passed when they may have changed.
+    """
+    from .conditional import bump_catalogue_version
+    from .facets import adjust_counts
+    from .storefront import invalidate_storefront
+    bump_catalogue_version()
+    if old_facets is not None or text_changed:
+        adjust_counts(old_facets or {}, new_facets or {}, invalidate=text_changed)
+    for seller_id in seller_ids:
+        invalidate_storefront(seller_id)
+    return f"Listing change applied for sellers {seller_ids}"
+
+@shared_task
+def process_image_task(model_label, pk):
+    """
+    Background task to dedupe, strip EXIF from and resize an uploaded image.
+    """
+    from .images import process_image
+    status = process_image(model_label, pk)
+    return f"Image of {model_label} #{pk}: {status}"
+
+@shared_task
+def import_listings_task(job_id):
+    """
+    Background task to import a seller's CSV/XLSX file of listings.
+    """
+    from .listing_import import run_import
+    from .models import ListingImportJob
+    job = ListingImportJob.objects.filter(id=job_id, status='pending').first()
+    if not job:
+        return "Import job not found or already started"
+    job = run_import(job)
+    return f"Import #{job_id} {job.status}: {job.created_count} created, {job.error_count} rows with errors"
+
+@shared_task
+def export_task(job_id):
+    """
+    Background task to write a CSV export to storage and notify its owner.
+    """
+    from .exports import run_export
+    from .models import ExportJob
+    job = ExportJob.objects.filter(id=job_id, status='pending').first()
+    if not job:
+        return "Export job not found or already started"
+    job = run_export(job)
+    return f"Export #{job_id} {job.status}: {job.row_count} rows"
+
+@shared_task
+def purge_exports_task():
+    """
+    Daily task to delete prepared exports past their retention period.
+    """
+    from .exports import purge_exports
+    purged = purge_exports()
+    return f"Purged {purged} exports"
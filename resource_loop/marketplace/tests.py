@@ -1,3 +1,57 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Category, SellerProfile, WasteItem
+from .reviews import reconcile_ratings, submit_review
+
+
+class RatingRoundingTests(TestCase):
+    """Reviews and the nightly reconcile must agree on how averages round."""
+
+    def setUp(self):
+        seller = SellerProfile.objects.create(
+            user=User.objects.create_user('seller', 'seller@example.com', 'pw'),
+            business_name='Seller',
+        )
+        self.item = WasteItem.objects.create(
+            seller=seller,
+            category=Category.objects.create(name='Metals'),
+            title='Copper wire',
+            price=1500,
+            county='Mombasa',
+        )
+        self.buyers = [User.objects.create_user(f'buyer{n}', f'buyer{n}@example.com', 'pw') for n in range(4)]
+
+    def review(self, *ratings):
+        for buyer, rating in zip(self.buyers, ratings):
+            submit_review(self.item, buyer, rating)
+        self.item.refresh_from_db()
+
+    def test_half_average_is_left_alone_by_reconcile(self):
+        self.review(5, 5, 4, 3)  # 4.25
+        self.assertEqual(self.item.rating, Decimal('4.3'))
+        updated_at = self.item.updated_at
+
+        self.assertEqual(reconcile_ratings(), 0)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.rating, Decimal('4.3'))
+        self.assertEqual(self.item.updated_at, updated_at)
+
+    def test_reconcile_rounds_drifted_rows_like_reviews(self):
+        self.review(5, 5, 4, 3)
+        WasteItem.objects.filter(pk=self.item.pk).update(rating_total=20, rating=5)
+
+        self.assertEqual(reconcile_ratings(), 1)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.rating_total, self.item.reviews_count), (17, 4))
+        self.assertEqual(self.item.rating, Decimal('4.3'))
+
+    def test_legacy_rating_is_kept(self):
+        WasteItem.objects.filter(pk=self.item.pk).update(
+            rating=Decimal('4.2'), rating_total=4, reviews_count=1, legacy_rating_total=4, legacy_reviews_count=1,
+        )
+        self.assertEqual(reconcile_ratings(), 0)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.rating, Decimal('4.2'))
@@ -0,0 +1,183 @@
+"""
+Listing photos uploaded outside the listing form.
+
+The browser first starts an UploadSession. Then:
+
+- With the `cloudinary` backend (production), the response carries signed
+  upload parameters. The browser sends the file straight to Cloudinary in
+  chunks (X-Unique-Upload-Id + Content-Range), then reports Cloudinary's
+  signed response back so the session can be completed.
+- With the `local` backend (development), the browser PUTs Content-Range
+  chunks to the app. They are appended to a temporary file and moved into the
+  default storage when the last byte arrives. An interrupted upload resumes
+  from `received`.
+
+Either way, add_listing receives only the session token (`image_ref`), so no
+web worker holds a multi-megabyte request body. Sessions that are never
+attached to a listing are purged with their files by purge_upload_sessions().
+"""
+import os
+import re
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.utils import timezone
+
+from .models import UploadSession
+
+UPLOAD_FOLDER = 'items'
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """A client mistake; the message is safe to return to the browser."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _temp_path(session):
+    return Path(settings.UPLOAD_TEMP_DIR) / f'{session.token}.part'
+
+
+def _cloudinary_public_id(session):
+    prefix = storages['default']._prepend_prefix(UPLOAD_FOLDER)
+    return f'{prefix}/{session.token}'
+
+
+def start_upload(user, filename, size, content_type):
+    """Create a session; returns (session, instructions for the browser)."""
+    if not content_type.startswith('image/'):
+        raise UploadError('Only image files can be uploaded.')
+    if not 0 < size <= settings.UPLOAD_MAX_BYTES:
+        raise UploadError(f'Images must be smaller than {settings.UPLOAD_MAX_BYTES // (1024 * 1024)} MB.')
+
+    session = UploadSession.objects.create(
+        user=user,
+        backend=settings.DIRECT_UPLOAD_BACKEND,
+        filename=os.path.basename(filename)[:255],
+        content_type=content_type,
+        size=size,
+    )
+    instructions = {'token': str(session.token), 'backend': session.backend, 'chunk_size': settings.UPLOAD_CHUNK_SIZE}
+    if session.backend == 'cloudinary':
+        instructions.update(cloudinary_upload_params(session))
+    return session, instructions
+
+
+def cloudinary_upload_params(session):
+    import cloudinary
+    import cloudinary.utils
+
+    config = cloudinary.config()
+    params = {
+        'public_id': _cloudinary_public_id(session),
+        'tags': storages['default'].TAG,
+        'timestamp': int(timezone.now().timestamp()),
+    }
+    params['signature'] = cloudinary.utils.api_sign_request(params, config.api_secret)
+    params['api_key'] = config.api_key
+    return {
+        'upload_url': f'https://api.cloudinary.com/v1_1/{config.cloud_name}/image/upload',
+        'params': params,
+    }
+
+
+def complete_cloudinary_upload(session, public_id, version, signature):
+    """Trust the asset only if Cloudinary signed this session's public_id."""
+    import cloudinary
+    import cloudinary.utils
+
+    expected = cloudinary.utils.api_sign_request({'public_id': public_id, 'version': version}, cloudinary.config().api_secret)
+    if public_id != _cloudinary_public_id(session) or signature != expected:
+        raise UploadError('Upload could not be verified.', status=403)
+    session.name = public_id
+    session.received = session.size
+    session.status = 'complete'
+    session.save(update_fields=['name', 'received', 'status', 'updated_at'])
+
+
+def receive_chunk(session, content_range, stream):
+    """
+    Append one `Content-Range: bytes start-end/total` chunk read from `stream`.
+    Chunks must arrive in order; a resumed upload continues at `received`.
+    """
+    match = _CONTENT_RANGE.match(content_range or '')
+    if not match:
+        raise UploadError('Missing or malformed Content-Range header.')
+    start, end, total = (int(g) for g in match.groups())
+    if total != session.size or end < start or end >= total:
+        raise UploadError('Content-Range does not match this upload.')
+    if start != session.received:
+        # Tell the client where to resume
+        raise UploadError(f'Expected a chunk starting at byte {session.received}.', status=409)
+    length = end - start + 1
+    if length > settings.UPLOAD_CHUNK_SIZE:
+        raise UploadError('Chunk is larger than the agreed chunk size.')
+
+    path = _temp_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('ab') as f:
+        f.truncate(start)
+        copied = _copy(stream, f, length)
+    if copied != length:
+        raise UploadError('Chunk was shorter than its Content-Range.')
+
+    session.received = end + 1
+    if session.received == session.size:
+        _finish_local(session, path)
+    session.save(update_fields=['received', 'name', 'status', 'updated_at'])
+
+
+def _copy(stream, f, length, block=64 * 1024):
+    copied = 0
+    while copied < length:
+        data = stream.read(min(block, length - copied))
+        if not data:
+            break
+        f.write(data)
+        copied += len(data)
+    return copied
+
+
+def _finish_local(session, path):
+    extension = os.path.splitext(session.filename)[1].lower()[:10] or '.jpg'
+    with path.open('rb') as f:
+        session.name = storages['default'].save(f'{UPLOAD_FOLDER}/{session.token}{extension}', File(f))
+    path.unlink(missing_ok=True)
+    session.status = 'complete'
+
+
+def claim_upload(user, token):
+    """Storage name of `user`'s finished upload `token`, consuming the session; None if invalid."""
+    try:
+        token = uuid.UUID(str(token))
+    except ValueError:
+        return None
+    session = UploadSession.objects.filter(token=token, user=user, status='complete').first()
+    if session is None:
+        return None
+    session.delete()
+    return session.name
+
+
+def purge_upload_sessions(hours=None):
+    """Delete sessions (and their files) never attached to a listing; returns how many."""
+    hours = settings.UPLOAD_SESSION_TTL_HOURS if hours is None else hours
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=hours))
+    storage = storages['default']
+    count = 0
+    for session in stale.iterator():
+        _temp_path(session).unlink(missing_ok=True)
+        if session.name:
+            storage.delete(session.name)
+        elif session.backend == 'cloudinary':
+            storage.delete(_cloudinary_public_id(session))
+        session.delete()
+        count += 1
+    return count
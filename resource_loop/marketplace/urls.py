@@ -8,6 +8,7 @@ router = DefaultRouter()
 router.register(r'items', api_views.MarketplaceViewSet)
 router.register(r'notifications', api_views.NotificationViewSet, basename='notification')
 router.register(r'otp', api_views.OTPViewSet, basename='otp')
+router.register(r'imports', api_views.ListingImportViewSet, basename='listing-import')
 
 urlpatterns = [
     path('debug-static/', views.debug_static_files, name='debug_static'),
@@ -15,6 +16,7 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('search/', views.search_results, name='search'),
     path('item/<slug:slug>/', views.item_detail, name='item_detail'),
+    path('item/<int:item_id>/review/', views.add_review, name='add_review'),
     path('loop2/', views.loop2_demo, name='loop2_demo'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('dashboard/user/', views.user_dashboard, name='user_dashboard'),
@@ -23,6 +25,13 @@ urlpatterns = [
     path('notifications/read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
     path('dashboard/seller/', views.seller_dashboard, name='seller_dashboard'),
     path('add-listing/', views.add_listing, name='add_listing'),
+    path('seller/import/', views.import_listings, name='import_listings'),
+    path('seller/import/<int:job_id>/', views.import_status, name='import_status'),
+    path('exports/', views.exports, name='exports'),
+    path('exports/<slug:kind>.csv', views.export_csv, name='export_csv'),
+    path('exports/<int:job_id>/download/', views.export_download, name='export_download'),
+    path('uploads/', views.start_image_upload, name='start_image_upload'),
+    path('uploads/<uuid:token>/', views.image_upload, name='image_upload'),
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<int:item_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
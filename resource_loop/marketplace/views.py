@@ -6,13 +6,13 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.db.models import Q, Count
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_http_methods
 from django.urls import reverse
 from .models import WasteItem, Category, Cart, CartItem, BuyerProfile, SellerProfile, ShippingConfiguration
-from .models import Transaction, Order, OrderItem, OTP, ActivityLog, Notification
+from .models import Transaction, Order, OrderItem, ActivityLog, Notification, UploadSession, ListingImportJob, ExportJob
 from django.db import models
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.conf import settings
@@ -23,8 +23,20 @@ import random
 import time
 import uuid
 from .locations import KENYA_LOCATIONS
+from .conditional import catalogue_conditional, catalogue_state, item_state
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .recommendations import recommended_items_for, related_items_for
+from .reviews import submit_review
+from .storefront import storefront_page
+from .exports import EXPORTS, available_exports, export_filename, export_rows, job_filename, start_export, stream_csv
+from .listing_import import COLUMN_ALIASES, ImportFileError, create_import
+from .uploads import UploadError, claim_upload, complete_cloudinary_upload, receive_chunk, start_upload
+from .mail_queue import queue_email
+from .otp_store import issue_otp, verify_otp
+from .facets import PRICE_BANDS, VERIFIED_LABELS, apply_facet_filters, facet_counts
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 import os
 
 logger = logging.getLogger(__name__)
@@ -68,27 +80,15 @@ def calculate_shipping_fee(seller_county, buyer_county):
         return float(config.different_county_fee)
 
 def send_otp_email(user, otp):
-    logger.info(f"📧 Preparing to send OTP {otp} to {user.email}...")
-    # Import here to avoid circular import or startup errors
-    try:
-        from .tasks import send_email_task
-        # Use Celery task
-        message = f'Your verification code is: {otp}\n\nThe code will expire in 15 minutes.'
-        send_email_task.delay(
-            'Verify your Resource Loop Account',
-            message,
-            [user.email]
-        )
-    except ImportError:
-        # Fallback if Celery is not set up
-        from django.core.mail import send_mail
-        send_mail(
-            'Verify your Resource Loop Account',
-            f'Your verification code is: {otp}',
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False
-        )
+    logger.info(f"📧 Queueing verification code for {user.email}...")
+    # Delivered in the background (Celery or the in-process queue), never inline
+    message = f'Your verification code is: {otp}\n\nThe code will expire in {settings.OTP_TTL // 60} minutes.'
+    queue_email(
+        'Verify your Resource Loop Account',
+        message,
+        [user.email],
+        transient=True,
+    )
 
 def verify_email_view(request):
     if request.method == 'POST':
@@ -97,13 +97,7 @@ def verify_email_view(request):
         
         try:
             user = User.objects.get(id=user_id)
-            # Check DB for valid OTP
-            otp_obj = OTP.objects.filter(user=user, code=otp_code, is_used=False).order_by('-created_at').first()
-            
-            if otp_obj and otp_obj.is_valid():
-                otp_obj.is_used = True
-                otp_obj.save()
-                
+            if otp_code and verify_otp(user, otp_code):
                 user.is_active = True
                 user.save()
                 
@@ -155,12 +149,11 @@ def index(request):
     }
     return render(request, 'marketplace/index.html', context)
 
-def search_results(request):
+def _search_queryset(request):
     query = request.GET.get('q')
     category_slug = request.GET.get('category')
-    
+
     items = WasteItem.objects.all()
-    categories = Category.objects.all()
 
     if query:
         items = items.filter(
@@ -170,28 +163,134 @@ def search_results(request):
     
     if category_slug:
         items = items.filter(category__slug=category_slug)
+    return apply_facet_filters(items, request.GET)
+
+@catalogue_conditional(lambda request: catalogue_state())
+def search_results(request):
+    query = request.GET.get('q')
+    items = _search_queryset(request)
+    categories = Category.objects.all()
 
-    paginator = Paginator(items, 12) 
+    items = items.select_related('category')
+    paginator = EstimatedCountPaginator(items, 12)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+
+    if page_number:
+        # Numbered pages are kept for existing links
+        page_obj = paginator.get_page(page_number)
+        next_url = _page_url(request, page=page_obj.next_page_number()) if page_obj.has_next() else None
+        previous_url = _page_url(request, page=page_obj.previous_page_number()) if page_obj.has_previous() else None
+    else:
+        # Keyset navigation: every page is an index range scan, however deep
+        page_obj = KeysetPaginator(items, 12).page(after=request.GET.get('after'), before=request.GET.get('before'))
+        next_url = _page_url(request, after=page_obj.next_cursor) if page_obj.has_next() and page_obj.next_cursor else None
+        previous_url = _page_url(request, before=page_obj.previous_cursor) if page_obj.has_previous() and page_obj.previous_cursor else None
+
+    # Catalogue-wide counts are materialized; filtered views are grouped once and cached
+    is_filtered = any(request.GET.get(p) for p in ('q', 'category', 'county', 'condition', 'price_band', 'verified'))
+    counts = facet_counts(items if is_filtered else None)
 
     context = {
         'items': page_obj,
         'categories': categories,
-        'query': query
+        'query': query,
+        'facet_groups': _facet_groups(request, counts, categories),
+        'result_count': paginator.count,
+        'next_url': next_url,
+        'previous_url': previous_url,
     }
     return render(request, 'marketplace/search.html', context)
 
+def _facet_groups(request, counts, categories):
+    """Sidebar facet options with counts and toggle links for the search page."""
+    categories_by_id = {str(c.id): c for c in categories}
+    condition_labels = dict(WasteItem.CONDITION_CHOICES)
+    band_labels = {key: label for key, label, _lower, _upper in PRICE_BANDS}
+
+    def option(param, value, label, count):
+        query = request.GET.copy()
+        for key in ('page', 'after', 'before'):
+            query.pop(key, None)
+        active = query.get(param) == value
+        if active:
+            query.pop(param)
+        else:
+            query[param] = value
+        return {'label': label, 'count': count, 'url': f"?{query.urlencode()}", 'active': active}
+
+    category_counts = counts.get('category', {})
+    county_counts = counts.get('county', {})
+    condition_counts = counts.get('condition', {})
+    band_counts = counts.get('price_band', {})
+    verified_counts = counts.get('verified', {})
+
+    groups = [
+        ('Categories', [
+            option('category', c.slug, c.name, category_counts[cid])
+            for cid, c in categories_by_id.items() if cid in category_counts
+        ]),
+        ('County', [
+            option('county', county, county, n)
+            for county, n in sorted(county_counts.items(), key=lambda kv: -kv[1])
+        ]),
+        ('Condition', [
+            option('condition', key, label, condition_counts[key])
+            for key, label in condition_labels.items() if key in condition_counts
+        ]),
+        ('Price Range', [
+            option('price_band', key, label, band_counts[key])
+            for key, label in band_labels.items() if key in band_counts
+        ]),
+        ('Seller', [
+            option('verified', key, label, verified_counts[key])
+            for key, label in VERIFIED_LABELS.items() if key in verified_counts
+        ]),
+    ]
+    return [{'title': title, 'options': options} for title, options in groups if options]
+
+def _page_url(request, **params):
+    """Current query string with the pagination parameters replaced by `params`."""
+    query = request.GET.copy()
+    for key in ('page', 'after', 'before'):
+        query.pop(key, None)
+    query.update(params)
+    return f"?{query.urlencode()}"
+
+@catalogue_conditional(lambda request, slug: item_state(slug))
 def item_detail(request, slug):
     item = get_object_or_404(WasteItem, slug=slug)
-    related_items = WasteItem.objects.filter(category=item.category).exclude(id=item.id)[:4]
+    related_items = related_items_for(item, limit=4)
+    
+    reviews = item.reviews.select_related('user')[:10]
     
     context = {
         'item': item,
-        'related_items': related_items
+        'related_items': related_items,
+        'reviews': reviews,
     }
     return render(request, 'marketplace/detail.html', context)
 
+@login_required
+@require_POST
+def add_review(request, item_id):
+    item = get_object_or_404(WasteItem, id=item_id)
+
+    if item.seller.user_id == request.user.id:
+        messages.error(request, "You cannot review your own item.")
+        return redirect('item_detail', slug=item.slug)
+
+    try:
+        rating = int(request.POST.get('rating', 0))
+    except ValueError:
+        rating = 0
+    if not 1 <= rating <= 5:
+        messages.error(request, "Please choose a rating between 1 and 5.")
+        return redirect('item_detail', slug=item.slug)
+
+    submit_review(item, request.user, rating, request.POST.get('comment', '').strip())
+    messages.success(request, "Thanks for your review!")
+    return redirect('item_detail', slug=item.slug)
+
 def loop2_demo(request):
     categories = Category.objects.all()
     recent_items = WasteItem.objects.all().order_by('-created_at')[:12]
@@ -259,10 +358,8 @@ def user_dashboard(request):
     total_spent = sum(order.total_amount for order in orders)
     pending_orders = orders.filter(status__in=['placed', 'confirmed', 'processing']).count()
 
-    # Recommended Items (Simple logic: Items not in cart, random selection)
-    # In a real app, this would be based on purchase history
-    all_items = list(WasteItem.objects.filter(stock_quantity__gt=0).exclude(seller__user=request.user))
-    recommended_items = random.sample(all_items, min(len(all_items), 4))
+    # Recommended Items (precomputed from purchase history, random sample for new users)
+    recommended_items = recommended_items_for(request.user, limit=4)
 
     recent_items = WasteItem.objects.order_by('-created_at')[:8]
     categories = Category.objects.all()
@@ -370,12 +467,14 @@ def all_notifications(request):
     return render(request, 'marketplace/notifications.html', {'notifications': notifications})
 
 def seller_profile_public(request, seller_id):
-    seller = get_object_or_404(SellerProfile, id=seller_id)
-    items = WasteItem.objects.filter(seller=seller, stock_quantity__gt=0)
-    
+    seller = get_object_or_404(SellerProfile.objects.select_related('user'), id=seller_id)
+    page_obj = storefront_page(seller, after=request.GET.get('after'), before=request.GET.get('before'))
+
     context = {
         'seller': seller,
-        'items': items,
+        'items': page_obj,
+        'next_url': _page_url(request, after=page_obj.next_cursor) if page_obj.has_next() and page_obj.next_cursor else None,
+        'previous_url': _page_url(request, before=page_obj.previous_cursor) if page_obj.has_previous() and page_obj.previous_cursor else None,
     }
     return render(request, 'marketplace/seller_profile_public.html', context)
 
@@ -412,7 +511,8 @@ def add_listing(request):
             location=location,
             county=county,
             sub_county=sub_county,
-            image=request.FILES.get('image')
+            # Uploaded beforehand (see start_image_upload); the file field is the no-JS fallback
+            image=claim_upload(request.user, request.POST.get('image_ref')) or request.FILES.get('image')
         )
         return redirect('item_detail', slug=item.slug)
 
@@ -423,6 +523,146 @@ def add_listing(request):
     }
     return render(request, 'marketplace/add_listing.html', context)
 
+@login_required
+@require_POST
+def start_image_upload(request):
+    """
+    Start a listing photo upload. The browser then sends the file to Cloudinary
+    or to image_upload in chunks, and submits only the token with the listing.
+    """
+    if not hasattr(request.user, 'sellerprofile'):
+        return JsonResponse({'error': 'Only sellers can upload listing photos.'}, status=403)
+    try:
+        data = json.loads(request.body)
+        session, instructions = start_upload(
+            request.user, str(data.get('filename', '')), int(data.get('size', 0)), str(data.get('content_type', ''))
+        )
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid upload request.'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    instructions['upload_path'] = reverse('image_upload', args=[session.token])
+    return JsonResponse(instructions, status=201)
+
+@login_required
+def import_listings(request):
+    """Upload a CSV/XLSX file of listings; the rows are imported in the background."""
+    if not hasattr(request.user, 'sellerprofile'):
+        messages.info(request, "You need to register as a seller to list items.")
+        return redirect('seller_signup')
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, "Choose a CSV or XLSX file to import.")
+        else:
+            try:
+                create_import(request.user, upload)
+                messages.success(request, "Import started. Your listings will appear as the file is processed.")
+            except ImportFileError as e:
+                messages.error(request, str(e))
+        return redirect('import_listings')
+
+    context = {
+        'jobs': ListingImportJob.objects.filter(user=request.user)[:10],
+        'columns': sorted(set(COLUMN_ALIASES.values())),
+        'categories': Category.objects.all(),
+        'condition_choices': WasteItem.CONDITION_CHOICES,
+    }
+    return render(request, 'marketplace/listing_import.html', context)
+
+@login_required
+def import_status(request, job_id):
+    """Progress of one import, polled by the import page."""
+    job = get_object_or_404(ListingImportJob, id=job_id, user=request.user)
+    return JsonResponse({
+        'status': job.status,
+        'progress': job.progress,
+        'processed_rows': job.processed_rows,
+        'total_rows': job.total_rows,
+        'created_count': job.created_count,
+        'error_count': job.error_count,
+        'errors': job.errors,
+        'message': job.message,
+    })
+
+def _export_range(params):
+    """(since, until) dates from the export form; unparseable dates are ignored."""
+    def parse(value):
+        try:
+            return parse_date(value or '')
+        except ValueError:
+            return None
+    return parse(params.get('since')), parse(params.get('until'))
+
+@login_required
+def exports(request):
+    """Export page. POST prepares a compressed file in the background."""
+    kinds = available_exports(request.user)
+    if not kinds:
+        messages.error(request, "You don't have any data to export.")
+        return redirect('dashboard')
+
+    if request.method == 'POST':
+        kind = request.POST.get('kind')
+        export_format = request.POST.get('format')
+        if export_format not in dict(ExportJob.FORMAT_CHOICES):
+            export_format = 'csv'
+        if kind in kinds:
+            since, until = _export_range(request.POST)
+            job = ExportJob.objects.create(user=request.user, kind=kind, format=export_format, since=since, until=until)
+            start_export(job)
+            messages.success(request, "Your export is being prepared. You'll get a notification when it's ready.")
+        return redirect('exports')
+
+    context = {
+        'kinds': [(kind, dict(ExportJob.KIND_CHOICES)[kind]) for kind in kinds],
+        'formats': ExportJob.FORMAT_CHOICES,
+        'jobs': ExportJob.objects.filter(user=request.user)[:10],
+        'retention_days': settings.EXPORT_RETENTION_DAYS,
+    }
+    return render(request, 'marketplace/exports.html', context)
+
+@login_required
+def export_csv(request, kind):
+    """Stream an export straight to the browser, one database chunk at a time."""
+    if kind not in EXPORTS or kind not in available_exports(request.user):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    since, until = _export_range(request.GET)
+    response = StreamingHttpResponse(
+        stream_csv(export_rows(kind, request.user, since, until)), content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, since, until)}"'
+    return response
+
+@login_required
+def export_download(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, user=request.user, status='done')
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job_filename(job))
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'POST'])
+def image_upload(request, token):
+    """
+    GET: progress, for resuming. PUT: one Content-Range chunk (local backend).
+    POST: Cloudinary's signed upload response (cloudinary backend).
+    """
+    session = get_object_or_404(UploadSession, token=token, user=request.user)
+    try:
+        if request.method == 'PUT' and session.status == 'pending' and session.backend == 'local':
+            receive_chunk(session, request.headers.get('Content-Range'), request)
+        elif request.method == 'POST' and session.status == 'pending' and session.backend == 'cloudinary':
+            data = json.loads(request.body)
+            complete_cloudinary_upload(session, data.get('public_id'), data.get('version'), data.get('signature'))
+        elif request.method != 'GET':
+            return JsonResponse({'error': 'This upload does not accept that request.'}, status=409)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid upload request.'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e), 'received': session.received}, status=e.status)
+    return JsonResponse({'token': str(session.token), 'received': session.received,
+                         'size': session.size, 'status': session.status})
+
 @require_POST
 def add_to_cart(request, item_id):
     item = get_object_or_404(WasteItem, id=item_id)
@@ -602,8 +842,7 @@ def signup_view(request):
         if existing_user and not existing_user.is_active:
             # Resend OTP flow
             # Update password if provided? For now, just resend OTP
-            otp_code = str(random.randint(100000, 999999))
-            OTP.objects.create(user=existing_user, code=otp_code)
+            otp_code = issue_otp(existing_user)
             request.session['verification_user_id'] = existing_user.id
             
             try:
@@ -626,8 +865,7 @@ def signup_view(request):
             profile.save()
             
             # Generate OTP
-            otp_code = str(random.randint(100000, 999999))
-            OTP.objects.create(user=user, code=otp_code)
+            otp_code = issue_otp(user)
             
             # Store user ID in session for verification page
             request.session['verification_user_id'] = user.id
@@ -667,8 +905,7 @@ def login_view(request):
             user = form.get_user()
             
             # Generate OTP
-            otp_code = str(random.randint(100000, 999999))
-            OTP.objects.create(user=user, code=otp_code)
+            otp_code = issue_otp(user)
             
             # Store user ID in session for verification
             request.session['verification_user_id'] = user.id
@@ -879,21 +1116,17 @@ def send_seller_notifications(order):
         
         # 1. Send Email (Async)
         if seller.user.email:
-            try:
-                from .tasks import send_email_task
-                # Render HTML email
-                context = {
-                    'seller': seller,
-                    'order': order,
-                    'items': items,
-                    'total_value': total_value,
-                    'domain': f"http://{settings.SITE_DOMAIN}" if not settings.SITE_DOMAIN.startswith('http') else settings.SITE_DOMAIN,
-                    'year': timezone.now().year
-                }
-                html_message = render_to_string('emails/seller_order_notification.html', context)
-                send_email_task.delay(subject, message, [seller.user.email], html_message=html_message)
-            except ImportError:
-                pass # Or fallback to sync send_mail
+            # Render HTML email
+            context = {
+                'seller': seller,
+                'order': order,
+                'items': items,
+                'total_value': total_value,
+                'domain': f"http://{settings.SITE_DOMAIN}" if not settings.SITE_DOMAIN.startswith('http') else settings.SITE_DOMAIN,
+                'year': timezone.now().year
+            }
+            html_message = render_to_string('emails/seller_order_notification.html', context)
+            queue_email(subject, message, [seller.user.email], html_message=html_message)
         
         # 2. Create In-App Notification (Async)
         from .tasks import create_notification_task
@@ -934,19 +1167,15 @@ def send_buyer_order_confirmation(order):
     )
     
     # Async Email
-    try:
-        from .tasks import send_email_task
-        # Render HTML email
-        context = {
-            'order': order,
-            'items': order.items.all(),
-            'domain': f"http://{settings.SITE_DOMAIN}" if not settings.SITE_DOMAIN.startswith('http') else settings.SITE_DOMAIN,
-            'year': timezone.now().year
-        }
-        html_message = render_to_string('emails/buyer_order_confirmation.html', context)
-        send_email_task.delay(subject, message, [order.user.email], html_message=html_message)
-    except ImportError:
-        pass
+    # Render HTML email
+    context = {
+        'order': order,
+        'items': order.items.all(),
+        'domain': f"http://{settings.SITE_DOMAIN}" if not settings.SITE_DOMAIN.startswith('http') else settings.SITE_DOMAIN,
+        'year': timezone.now().year
+    }
+    html_message = render_to_string('emails/buyer_order_confirmation.html', context)
+    queue_email(subject, message, [order.user.email], html_message=html_message)
 
     # Create In-App Notification
     from .tasks import create_notification_task
@@ -1034,8 +1263,7 @@ def seller_signup_view(request):
             seller_profile.save()
             
             # Generate OTP
-            otp_code = str(random.randint(100000, 999999))
-            OTP.objects.create(user=user, code=otp_code)
+            otp_code = issue_otp(user)
             
             # Store user ID in session
             request.session['verification_user_id'] = user.id
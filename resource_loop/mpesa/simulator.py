@@ -0,0 +1,236 @@
+"""
+A local stand-in for the Safaricom Daraja API, for offline and load testing.
+
+It implements the two endpoints mpesa.utils uses:
+
+    GET  /oauth/v1/generate?grant_type=client_credentials
+    POST /mpesa/stkpush/v1/processrequest
+
+STK pushes answer after a configurable latency and fail at a configurable
+rate. Each accepted push later gets a callback POSTed to its CallBackURL (or a
+fixed override), sent by a pool of threads throttled to `callback_rate` per
+second. The callbacks are shaped like Daraja's, so the app processes them the
+same way it processes real ones. GET /simulator/stats reports counters.
+
+Run it with `manage.py run_daraja_simulator` and set MPESA_API_BASE_URL to its
+address.
+"""
+import base64
+import json
+import logging
+import queue
+import random
+import secrets
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+TOKEN_LIFETIME = 3599
+
+
+class DarajaSimulator:
+    def __init__(self, host='127.0.0.1', port=8765, latency_ms=200, jitter_ms=50, failure_rate=0.0,
+                 cancel_rate=0.0, callback_delay=2.0, callback_rate=50.0, callback_workers=8,
+                 callback_url=None, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.failure_rate = failure_rate
+        self.cancel_rate = cancel_rate
+        self.callback_delay = callback_delay
+        self.callback_interval = 1 / callback_rate if callback_rate > 0 else 0
+        self.callback_url = callback_url
+        self.rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._next_callback_at = 0.0
+        self.stats = {'tokens': 0, 'stk_accepted': 0, 'stk_failed': 0, 'stk_unauthorized': 0,
+                      'callbacks_sent': 0, 'callbacks_failed': 0}
+
+        self._callbacks = queue.PriorityQueue()
+        self._sequence = 0
+        self._workers = [
+            threading.Thread(target=self._send_callbacks, name=f'daraja-callback-{n}', daemon=True)
+            for n in range(callback_workers)
+        ]
+
+        handler = type('Handler', (DarajaRequestHandler,), {'simulator': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def serve_forever(self):
+        for worker in self._workers:
+            worker.start()
+        self.server.serve_forever()
+
+    def start(self):
+        """Serve from a background thread (for use inside another process)."""
+        thread = threading.Thread(target=self.serve_forever, name='daraja-simulator', daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    # --- Endpoints ---------------------------------------------------------
+
+    def issue_token(self):
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._tokens[token] = time.time() + TOKEN_LIFETIME
+            self.stats['tokens'] += 1
+        return {'access_token': token, 'expires_in': str(TOKEN_LIFETIME)}
+
+    def token_valid(self, token):
+        with self._lock:
+            expires = self._tokens.get(token)
+        return expires is not None and expires > time.time()
+
+    def stk_push(self, payload):
+        """Return (status, body) for an STK push request, scheduling its callback when accepted."""
+        time.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+
+        if self.rng.random() < self.failure_rate:
+            self.count('stk_failed')
+            return 500, {
+                'requestId': secrets.token_hex(8),
+                'errorCode': '500.001.1001',
+                'errorMessage': 'Unable to lock subscriber, a transaction is already in process for the current subscriber',
+            }
+
+        required = ('BusinessShortCode', 'Amount', 'PhoneNumber') + (() if self.callback_url else ('CallBackURL',))
+        missing = [field for field in required if not payload.get(field)]
+        if missing:
+            self.count('stk_failed')
+            return 400, {'requestId': secrets.token_hex(8), 'errorCode': '400.002.02',
+                         'errorMessage': f'Bad Request - Invalid {missing[0]}'}
+
+        merchant_request_id = f'{self.rng.randint(10000, 99999)}-{self.rng.randint(1000000, 9999999)}-1'
+        checkout_request_id = f'ws_CO_{datetime.now():%d%m%Y%H%M%S}{secrets.token_hex(6)}'
+        self.count('stk_accepted')
+        self._schedule_callback(payload, merchant_request_id, checkout_request_id)
+        return 200, {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+    # --- Callbacks ---------------------------------------------------------
+
+    def _schedule_callback(self, payload, merchant_request_id, checkout_request_id):
+        if self.rng.random() < self.cancel_rate:
+            callback = {'MerchantRequestID': merchant_request_id, 'CheckoutRequestID': checkout_request_id,
+                        'ResultCode': 1032, 'ResultDesc': 'Request cancelled by user'}
+        else:
+            callback = {
+                'MerchantRequestID': merchant_request_id,
+                'CheckoutRequestID': checkout_request_id,
+                'ResultCode': 0,
+                'ResultDesc': 'The service request is processed successfully.',
+                'CallbackMetadata': {'Item': [
+                    {'Name': 'Amount', 'Value': float(payload.get('Amount', 0))},
+                    {'Name': 'MpesaReceiptNumber', 'Value': secrets.token_hex(5).upper()},
+                    {'Name': 'TransactionDate', 'Value': int(f'{datetime.now():%Y%m%d%H%M%S}')},
+                    {'Name': 'PhoneNumber', 'Value': int(payload.get('PhoneNumber') or 0)},
+                ]},
+            }
+        url = self.callback_url or payload.get('CallBackURL')
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        self._callbacks.put((time.time() + self.callback_delay, sequence, url, {'Body': {'stkCallback': callback}}))
+
+    def _send_callbacks(self):
+        while True:
+            due, sequence, url, body = self._callbacks.get()
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+
+            # Spread sends out to at most `callback_rate` per second across all workers
+            with self._lock:
+                now = time.time()
+                send_at = max(now, self._next_callback_at)
+                self._next_callback_at = send_at + self.callback_interval
+            if send_at > now:
+                time.sleep(send_at - now)
+
+            try:
+                response = requests.post(url, json=body, timeout=10)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                logger.warning('Callback for %s to %s failed: %s',
+                               body['Body']['stkCallback']['CheckoutRequestID'], url, e)
+                self.count('callbacks_failed')
+            else:
+                self.count('callbacks_sent')
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, callbacks_pending=self._callbacks.qsize())
+
+
+class DarajaRequestHandler(BaseHTTPRequestHandler):
+    simulator = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/oauth/v1/generate':
+            auth = self.headers.get('Authorization', '')
+            grant_type = parse_qs(url.query).get('grant_type', [''])[0]
+            if not auth.startswith('Basic ') or grant_type != 'client_credentials':
+                return self.send_json(400, {'errorCode': '400.008.01', 'errorMessage': 'Invalid Authentication passed'})
+            try:
+                base64.b64decode(auth[len('Basic '):], validate=True)
+            except ValueError:
+                return self.send_json(400, {'errorCode': '400.008.01', 'errorMessage': 'Invalid Authentication passed'})
+            return self.send_json(200, self.simulator.issue_token())
+        if url.path == '/simulator/stats':
+            return self.send_json(200, self.simulator.snapshot())
+        self.send_json(404, {'errorMessage': 'Not found'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/mpesa/stkpush/v1/processrequest':
+            return self.send_json(404, {'errorMessage': 'Not found'})
+
+        token = self.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not self.simulator.token_valid(token):
+            self.simulator.count('stk_unauthorized')
+            return self.send_json(401, {'errorCode': '404.001.04', 'errorMessage': 'Invalid Access Token'})
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.send_json(400, {'errorCode': '400.002.02', 'errorMessage': 'Bad Request - Invalid JSON'})
+        self.send_json(*self.simulator.stk_push(payload))
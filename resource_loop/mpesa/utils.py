@@ -4,25 +4,39 @@ import json
 from datetime import datetime
 from requests.auth import HTTPBasicAuth
 from django.conf import settings
+from django.core.cache import cache
+
+TOKEN_CACHE_KEY = 'mpesa:access_token'
 
 # utils.py (Partial update)
 
 def get_access_token():
+    # Daraja tokens live for an hour; fetching one per payment doubles the round trips
+    token = cache.get(TOKEN_CACHE_KEY)
+    if token:
+        return token
+
     consumer_key = settings.CONSUMER_KEY
     consumer_secret = settings.CONSUMER_SECRET
     
     # 1. Use the clean URL (no ?grant_type=... here)
-    api_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate"
+    api_url = f"{settings.MPESA_API_BASE_URL}/oauth/v1/generate"
     
     try:
         # 2. Pass parameters separately to avoid URL encoding issues
         response = requests.get(
             api_url, 
             params={"grant_type": "client_credentials"},
-            auth=HTTPBasicAuth(consumer_key, consumer_secret)
+            auth=HTTPBasicAuth(consumer_key, consumer_secret),
+            timeout=settings.MPESA_REQUEST_TIMEOUT
         )
         response.raise_for_status()
-        return response.json().get("access_token")
+        data = response.json()
+        token = data.get("access_token")
+        if token:
+            # Refresh a minute early so a token never expires mid-request
+            cache.set(TOKEN_CACHE_KEY, token, max(int(data.get("expires_in", 3599)) - 60, 60))
+        return token
     except Exception as e:
         print(f"Error generating token: {str(e)}")
         return None
@@ -40,9 +54,9 @@ def generate_password():
     # 1. Get the current timestamp
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     
-    # 2. Use settings for Shortcode, but keep hardcoded Passkey for Sandbox if not in settings
+    # 2. Shortcode and Passkey from settings (both default to the Sandbox values)
     shortcode = settings.SHORTCODE
-    passkey = "bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919"
+    passkey = settings.PASSKEY
     
     # 3. Generate the password
     data_to_encode = str(shortcode) + passkey + timestamp
@@ -61,7 +75,7 @@ def stk_push(amount, phone):
     formatted_phone = format_phone_number(phone)
 
     # --- CRITICAL FIX: This is the correct STK Push URL ---
-    api_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
+    api_url = f"{settings.MPESA_API_BASE_URL}/mpesa/stkpush/v1/processrequest"
 
     headers = {
         "Authorization": f"Bearer {token}",  # Fixed: using variable 'token', not function
@@ -108,7 +122,10 @@ def stk_push(amount, phone):
     #     print(f"Request Error: {e}")
     #     return {"error": str(e)}
     try:
-        response = requests.post(api_url, json=payload, headers=headers)
+        response = requests.post(api_url, json=payload, headers=headers, timeout=settings.MPESA_REQUEST_TIMEOUT)
+        if response.status_code == 401:
+            # Token revoked or expired early: drop it so the next payment fetches a new one
+            cache.delete(TOKEN_CACHE_KEY)
         response.raise_for_status()
         return response.json()
         
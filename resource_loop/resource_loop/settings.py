@@ -3,7 +3,9 @@ Django settings for resource_loop project.
 """
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # 1. BASE_DIR & ENV
@@ -69,6 +71,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # Whitenoise enabled
+    'marketplace.middleware.PerformanceMiddleware', # Per-view timings, query counts, N+1 warnings
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -143,6 +146,10 @@ if IS_RENDER:
         "default": {
             "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
         },
+        # Non-image files (log archives, exports)
+        "archives": {
+            "BACKEND": "cloudinary_storage.storage.RawMediaCloudinaryStorage",
+        },
         "staticfiles": {
             # Use WhiteNoise storage for serving static files
             "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
@@ -164,6 +171,9 @@ else:
         "default": {
             "BACKEND": "django.core.files.storage.FileSystemStorage",
         },
+        "archives": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
         },
@@ -175,6 +185,26 @@ else:
     DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
 
 
+# Responsive copies of uploaded listing and profile images (marketplace.images)
+IMAGE_VARIANT_WIDTHS = [320, 640, 1024]
+IMAGE_VARIANT_FORMATS = ['webp', 'jpeg']
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', 80))
+
+# Listing photos are uploaded before the form is submitted (marketplace.uploads):
+# straight to Cloudinary in production, in resumable chunks to MEDIA_ROOT locally
+DIRECT_UPLOAD_BACKEND = os.environ.get('DIRECT_UPLOAD_BACKEND', 'cloudinary' if IS_RENDER else 'local')
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024  # Cloudinary needs chunks of at least 5 MB
+UPLOAD_TEMP_DIR = os.environ.get('UPLOAD_TEMP_DIR', os.path.join(tempfile.gettempdir(), 'resource_loop_uploads'))
+UPLOAD_SESSION_TTL_HOURS = 24
+
+# Bulk listing import (CSV/XLSX), see marketplace.listing_import
+LISTING_IMPORT_MAX_BYTES = int(os.environ.get('LISTING_IMPORT_MAX_BYTES', 50 * 1024 * 1024))
+
+# Prepared CSV exports (marketplace.exports) are deleted after this many days
+EXPORT_RETENTION_DAYS = int(os.environ.get('EXPORT_RETENTION_DAYS', 7))
+
+
 # 8. AUTHENTICATION & REDIRECTS
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTHENTICATION_BACKENDS = [
@@ -186,8 +216,12 @@ AUTHENTICATION_BACKENDS = [
 CONSUMER_KEY = os.environ.get('CONSUMER_KEY')
 CONSUMER_SECRET = os.environ.get('CONSUMER_SECRET')
 SHORTCODE = os.environ.get('SHORTCODE', '174379')
-PASSKEY = os.environ.get('PASSKEY')
+# Defaults are Safaricom's public sandbox credentials
+PASSKEY = os.environ.get('PASSKEY', 'bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919')
 CALLBACK_URL = os.environ.get('CALLBACK_URL', '')
+# Point at `manage.py run_daraja_simulator` (e.g. http://127.0.0.1:8765) to test payments offline
+MPESA_API_BASE_URL = os.environ.get('MPESA_API_BASE_URL', 'https://sandbox.safaricom.co.ke').rstrip('/')
+MPESA_REQUEST_TIMEOUT = float(os.environ.get('MPESA_REQUEST_TIMEOUT', 30))
 
 # 10. EMAIL SETTINGS (Using Brevo API via Anymail)
 # This uses HTTP (port 80/443) instead of SMTP (port 587/465) to bypass network blocks.
@@ -202,6 +236,13 @@ ANYMAIL = {
 if not os.environ.get('BREVO_API_KEY'):
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# In-process delivery threads used when Celery tasks run eagerly (no worker)
+EMAIL_QUEUE_WORKERS = int(os.environ.get('EMAIL_QUEUE_WORKERS', 2))
+EMAIL_QUEUE_MAX_SIZE = int(os.environ.get('EMAIL_QUEUE_MAX_SIZE', 100))
+EMAIL_QUEUE_SHUTDOWN_TIMEOUT = float(os.environ.get('EMAIL_QUEUE_SHUTDOWN_TIMEOUT', 10))
+# Saved (undelivered) emails older than this are dropped instead of retried
+EMAIL_RETRY_MAX_AGE = int(os.environ.get('EMAIL_RETRY_MAX_AGE', 24 * 3600))
+
 # 11. WHITENOISE SETTINGS
 WHITENOISE_KEEP_ONLY_HASHED_FILES = False
 WHITENOISE_USE_FINDERS = True
@@ -215,6 +256,63 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 # Run tasks synchronously locally or if forced by env var (useful for free tier deployment without worker)
 CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', str(DEBUG)) == 'True'
+# Queues: payment callbacks never wait behind email bursts, nor upkeep behind nightly jobs.
+# Each queue gets its own worker process in the Procfile (see concurrency there).
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'marketplace.tasks.process_mpesa_callback_task': {'queue': 'payments'},
+    'marketplace.tasks.send_email_task': {'queue': 'notifications'},
+    'marketplace.tasks.create_notification_task': {'queue': 'notifications'},
+    'marketplace.tasks.retry_pending_emails_task': {'queue': 'notifications'},
+    # Long jobs get the single-process `bulk` worker; short upkeep tasks (activity
+    # log flushes, facet/storefront updates, image variants, related listings,
+    # purges) stay on the default queue so they never wait behind an import.
+    'marketplace.tasks.import_listings_task': {'queue': 'bulk'},
+    'marketplace.tasks.export_task': {'queue': 'bulk'},
+    'marketplace.tasks.refresh_related_batch_task': {'queue': 'bulk'},
+    'marketplace.tasks.rebuild_recommendations_task': {'queue': 'bulk'},
+    'marketplace.tasks.reconcile_ratings_task': {'queue': 'bulk'},
+    'marketplace.tasks.prune_activity_log_task': {'queue': 'bulk'},
+}
+# Take one message at a time, so a long task never holds others hostage in its prefetch buffer
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Redis queues whose backlog (length, oldest message age) is reported on /metrics
+CELERY_MONITORED_QUEUES = ['payments', 'notifications', 'bulk', 'celery']
+# Periodic jobs, run by `celery -A resource_loop beat` (times in CELERY_TIMEZONE)
+CELERY_BEAT_SCHEDULE = {
+    'rebuild-recommendations': {
+        'task': 'marketplace.tasks.rebuild_recommendations_task',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'reconcile-ratings': {
+        'task': 'marketplace.tasks.reconcile_ratings_task',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'purge-upload-sessions': {
+        'task': 'marketplace.tasks.purge_upload_sessions_task',
+        'schedule': crontab(hour=5, minute=0),
+    },
+    'purge-exports': {
+        'task': 'marketplace.tasks.purge_exports_task',
+        'schedule': crontab(hour=5, minute=15),
+    },
+    'purge-otps': {
+        'task': 'marketplace.tasks.purge_otps_task',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'flush-activity-log': {
+        'task': 'marketplace.tasks.flush_activity_log_task',
+        'schedule': 30.0,
+    },
+    'prune-activity-log': {
+        'task': 'marketplace.tasks.prune_activity_log_task',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'retry-pending-emails': {
+        'task': 'marketplace.tasks.retry_pending_emails_task',
+        'schedule': crontab(minute='*/10'),
+    },
+}
 
 
 # 13. REST FRAMEWORK
@@ -253,6 +351,11 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        # Messages on this logger are already JSON; keep each line parseable
+        'structured': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'console': {
@@ -260,6 +363,11 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'structured': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
     },
     'loggers': {
         'django': {
@@ -272,5 +380,67 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'marketplace.task_events': {
+            'handlers': ['structured'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'marketplace.performance': {
+            'handlers': ['structured'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
     },
 }
+
+# Request instrumentation (marketplace.middleware.PerformanceMiddleware)
+PERFORMANCE_MONITORING = os.environ.get('PERFORMANCE_MONITORING', 'True') == 'True'
+PERFORMANCE_IGNORE_PATHS = ('/static/', '/media/', '/metrics')
+PERFORMANCE_N_PLUS_ONE_THRESHOLD = 5  # identical SQL statements in one request
+PERFORMANCE_SLOW_REQUEST_MS = 500
+# Prometheus-style /metrics endpoint, off unless enabled; protect it with a bearer token
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# 15. CACHE
+# Use Redis when REDIS_URL is configured (shared across gunicorn workers), else per-process memory.
+# OTP codes must be visible to every worker process, so without Redis they use a shared file cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        },
+        'otp': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'otp',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'otp': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('OTP_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'resource_loop_otp')),
+        },
+    }
+
+# 16. ACTIVITY LOG
+# Events are buffered and bulk-inserted; with Redis the buffer is shared and flushed by beat
+ACTIVITY_LOG_REDIS_URL = os.environ.get('REDIS_URL')
+ACTIVITY_LOG_BATCH_SIZE = 500
+ACTIVITY_LOG_MAX_BUFFER = 10000
+ACTIVITY_LOG_FLUSH_INTERVAL = 5  # seconds, in-memory buffer only
+ACTIVITY_LOG_RETENTION_DAYS = int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', 90))
+
+# 17. OTP VERIFICATION
+OTP_CACHE_ALIAS = 'otp'
+OTP_TTL = int(os.environ.get('OTP_TTL', 300))  # seconds a code stays valid
+OTP_MAX_ATTEMPTS = 5
+OTP_RESEND_COOLDOWN = 60
+# Keep a database record of issued/used codes (the codes themselves are never stored)
+OTP_AUDIT_TO_DB = os.environ.get('OTP_AUDIT_TO_DB', 'False') == 'True'
+OTP_AUDIT_RETENTION_DAYS = 30
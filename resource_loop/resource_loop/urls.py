@@ -14,6 +14,10 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
 ]
 
+if settings.METRICS_ENABLED:
+    from marketplace.metrics import metrics_view
+    urlpatterns += [path('metrics', metrics_view, name='metrics')]
+
 # Serve user-uploaded media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)